@@ -0,0 +1,254 @@
+"""Answer videos uploaded in pieces while the candidate is still recording.
+
+The browser's ``MediaRecorder`` hands out a piece of the recording every
+second or so. Each piece is appended to a file in the scratch space as it
+arrives, so when recording stops only the last piece is left to send. The
+analysis (downscaling, the Gemini upload and the model call) starts as soon
+as the upload is finished, and the answer submission just waits for it.
+
+Uploads are resumable: every piece is sent with the byte offset it starts
+at. A piece that was already received (a retry after a lost response) is
+skipped, and one that would leave a gap is refused with the offset the upload
+is at, which can also be read back with ``status``. A piece that fails half
+way is cut off again, so the file only ever holds whole pieces.
+
+Uploads belong to a user and, optionally, an interview session, and live in
+this process only. An upload stands for one answer, and is kept until the
+turn it was used for is recorded (``release``), so a submission that fails
+after the analysis can be retried without uploading the video again. Ones
+left idle for ``idle_timeout`` seconds are dropped, checked each time the
+scratch space is swept.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+
+from fastapi import HTTPException
+
+from executor import run_blocking
+from ingest import MAX_VIDEO_BYTES
+
+logger = logging.getLogger(__name__)
+
+OPEN = "open"
+FINISHED = "finished"
+
+
+class AnswerUploads:
+    def __init__(
+        self,
+        scratch,
+        analyze,
+        max_bytes: int = MAX_VIDEO_BYTES,
+        idle_timeout: float = 900.0,
+    ):
+        """``analyze(video_path, question)`` returns ``(scores, feedback, answer)``."""
+        self.scratch = scratch
+        self.analyze = analyze
+        self.max_bytes = max_bytes
+        self.idle_timeout = idle_timeout
+        self._uploads = {}
+        self.created = 0
+        self.finished = 0
+        self.expired = 0
+        self.pieces = 0
+        self.duplicate_pieces = 0
+        self.bytes_received = 0
+        self.analysis_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.results = 0
+        scratch.on_sweep.append(self.expire)
+
+    def create(self, username: str, session_id=None, question=None) -> dict:
+        """``question`` is the one being answered, if known."""
+        self.expire()
+        upload = {
+            "id": uuid.uuid4().hex,
+            "username": username,
+            "session_id": session_id,
+            "question": question,
+            "path": self.scratch.new_path(".webm"),
+            "received": 0,
+            "status": OPEN,
+            "lock": asyncio.Lock(),
+            "task": None,
+            # Number of the turn the analysis was used for
+            "turn": None,
+            "updated": time.monotonic(),
+        }
+        self._uploads[upload["id"]] = upload
+        self.created += 1
+        return upload
+
+    def _get(self, upload_id: str, username: str) -> dict:
+        upload = self._uploads.get(upload_id)
+        if upload is None or upload["username"] != username:
+            raise HTTPException(status_code=404, detail="Upload not found")
+        upload["updated"] = time.monotonic()
+        return upload
+
+    def status(self, upload_id: str, username: str) -> dict:
+        return public_upload(self._get(upload_id, username))
+
+    async def append(self, upload_id: str, username: str, offset: int, body) -> int:
+        """Writes the piece streamed by ``body`` at ``offset``; returns the
+        number of bytes received so far.
+        """
+        upload = self._get(upload_id, username)
+        async with upload["lock"]:
+            if upload["status"] != OPEN:
+                raise HTTPException(status_code=409, detail="Upload is finished")
+            received = upload["received"]
+            if offset > received:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Upload is at offset {received}",
+                    headers={"Upload-Offset": str(received)},
+                )
+            # Bytes of this piece that were already received
+            skip = received - offset
+            if skip:
+                self.duplicate_pieces += 1
+            out = await run_blocking(open, upload["path"], "ab")
+            try:
+                async for chunk in body:
+                    if skip:
+                        dropped = min(skip, len(chunk))
+                        chunk, skip = chunk[dropped:], skip - dropped
+                    if not chunk:
+                        continue
+                    if received + len(chunk) > self.max_bytes:
+                        raise HTTPException(
+                            status_code=413,
+                            detail=f"File exceeds the {self.max_bytes} byte upload limit",
+                        )
+                    self.scratch.reserve(upload["path"], len(chunk))
+                    await run_blocking(out.write, chunk)
+                    received += len(chunk)
+            except BaseException:
+                # Leave only whole pieces behind, so the client can resend
+                out.close()
+                await run_blocking(os.truncate, upload["path"], upload["received"])
+                self.scratch.track(upload["path"])
+                raise
+            out.close()
+            self.pieces += 1
+            self.bytes_received += received - upload["received"]
+            upload["received"] = received
+            return received
+
+    async def finish(self, upload_id: str, username: str) -> dict:
+        """Closes the upload and starts analyzing it."""
+        upload = self._get(upload_id, username)
+        async with upload["lock"]:
+            if upload["status"] == OPEN:
+                if not upload["received"]:
+                    raise HTTPException(status_code=400, detail="Upload is empty")
+                upload["status"] = FINISHED
+                upload["finished_at"] = time.monotonic()
+                upload["task"] = asyncio.create_task(self._analyze(upload))
+                self.finished += 1
+        return public_upload(upload)
+
+    async def _analyze(self, upload):
+        try:
+            return await self.analyze(upload["path"], upload["question"])
+        finally:
+            self.analysis_seconds += time.monotonic() - upload["finished_at"]
+
+    async def result(self, upload_id: str, username: str, session_id=None, turn=None):
+        """Waits for the analysis of a finished upload and returns it, for
+        answering ``turn``.
+
+        The upload stays until it is released. If the analysis failed, it is
+        started again.
+        """
+        upload = self._get(upload_id, username)
+        if session_id and upload["session_id"] not in (None, session_id):
+            raise HTTPException(
+                status_code=409, detail="Upload belongs to another interview"
+            )
+        if upload["status"] != FINISHED:
+            raise HTTPException(status_code=409, detail="Upload is not finished")
+        if turn is not None:
+            if upload["turn"] is None:
+                upload["turn"] = turn
+            elif upload["turn"] != turn:
+                raise HTTPException(
+                    status_code=409, detail="Upload was used for another answer"
+                )
+        if upload["task"] is None:
+            # The last analysis failed
+            upload["finished_at"] = time.monotonic()
+            upload["task"] = asyncio.create_task(self._analyze(upload))
+        task = upload["task"]
+        started = time.monotonic()
+        try:
+            # Shielded, so a dropped request doesn't cancel the analysis for
+            # a retry of the same submission
+            result = await asyncio.shield(task)
+        except Exception:
+            if task.done() and upload["task"] is task:
+                upload["task"] = None
+            raise
+        finally:
+            self.wait_seconds += time.monotonic() - started
+        self.results += 1
+        return result
+
+    def release(self, upload_id):
+        """Drops the upload once the turn it was used for is recorded."""
+        upload = self._uploads.get(upload_id)
+        if upload is not None:
+            self._discard(upload)
+
+    def _discard(self, upload):
+        self._uploads.pop(upload["id"], None)
+        task = upload["task"]
+        if task is not None:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                # Retrieved, so an unclaimed failure isn't logged as lost
+                task.exception()
+        self.scratch.release(upload["path"])
+
+    def expire(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        for upload in list(self._uploads.values()):
+            if upload["updated"] < cutoff:
+                logger.info("Dropping idle answer upload %s", upload["id"])
+                self._discard(upload)
+                self.expired += 1
+
+    def stats(self) -> dict:
+        return {
+            "open": sum(u["status"] == OPEN for u in self._uploads.values()),
+            "created": self.created,
+            "finished": self.finished,
+            "expired": self.expired,
+            "pieces": self.pieces,
+            "duplicate_pieces": self.duplicate_pieces,
+            "bytes_received": self.bytes_received,
+            # From the last piece landing to the analysis being done
+            "mean_analysis_seconds": (
+                round(self.analysis_seconds / self.finished, 3)
+                if self.finished
+                else None
+            ),
+            # How long answer submissions still waited for it
+            "mean_wait_seconds": (
+                round(self.wait_seconds / self.results, 3) if self.results else None
+            ),
+        }
+
+
+def public_upload(upload: dict) -> dict:
+    return {
+        "upload_id": upload["id"],
+        "received": upload["received"],
+        "status": upload["status"],
+    }
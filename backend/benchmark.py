@@ -0,0 +1,999 @@
+"""Local load benchmarks for the API.
+
+Runs against the ASGI app in-process (no MongoDB or Gemini key needed) with the
+slow upstream calls replaced by stubs, so numbers are comparable between runs.
+
+Usage:
+    python benchmark.py concurrency [--analyses 8] [--analysis-seconds 0.5]
+    python benchmark.py upload-memory [--uploads 4] [--video-mb 100]
+    python benchmark.py companies [--requests 200]
+    python benchmark.py company-search [--companies 50000]
+    python benchmark.py final-report [--llm-seconds 1.0] [--interviews 5]
+    python benchmark.py login [--logins 32]
+    python benchmark.py user-lookup [--users 1000000] [--lookups 200]
+    python benchmark.py session-payload [--turns 20]
+    python benchmark.py prompt-size [--turns 20]
+    python benchmark.py video-preprocess [--video answer.webm] [--uploads 4]
+    python benchmark.py answer-upload [--video-mb 20] [--upload-mbps 20]
+    python benchmark.py transcription --clips DIR [--stt-backend whisper]
+    python benchmark.py vision [--video answer.webm] [--uploads 4]
+    python benchmark.py llm-cache [--requests 200] [--llm-seconds 1.0]
+    python benchmark.py single-flight [--requests 200] [--llm-seconds 1.0]
+    python benchmark.py question-bank
+
+``transcription`` runs a local speech recognizer over every video or WAV file
+in ``--clips``; a ``<clip>.txt`` next to a clip is taken as its reference
+transcript, for the word error rate.
+
+``question-bank`` checks the section headings dropped from the question files
+in ``QUESTION_DATA_FILES``: with them gone, the questions of every list must
+be numbered 1, 2, 3, ... without gaps. It exits with status 1 if not.
+
+``user-lookup`` needs a real MongoDB (``MONGODB_URL``); it seeds and uses a
+separate ``<MONGODB_DB>_bench`` database.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import string
+import tempfile
+import time
+import tracemalloc
+import types
+
+import cv2
+import httpx
+import numpy as np
+import pandas as pd
+
+import bcrypt
+
+import compaction
+import database
+import interview_summary
+import llm_cache
+import main
+import passwords
+import transcription
+import video_preprocessing
+import vision
+from dataset import (
+    CompanyIndex,
+    item_number,
+    parse_questions,
+    read_table,
+    without_section_headings,
+)
+from executor import run_blocking
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def report(name, latencies):
+    latencies_ms = [latency * 1000 for latency in latencies]
+    print(
+        f"{name:<28} n={len(latencies_ms):<5} "
+        f"p50={percentile(latencies_ms, 50):8.1f}ms "
+        f"p99={percentile(latencies_ms, 99):8.1f}ms "
+        f"mean={statistics.mean(latencies_ms):8.1f}ms"
+    )
+
+
+async def timed_get(client, path, latencies, scheduled):
+    # Latency is measured from when the request was due, not when the loop got
+    # around to sending it, so a stalled event loop shows up in the numbers.
+    response = await client.get(path)
+    response.raise_for_status()
+    latencies.append(time.perf_counter() - scheduled)
+
+
+async def open_loop(client, path, rate, duration):
+    """Fires GETs at a fixed rate for ``duration`` seconds; returns latencies."""
+    latencies = []
+    requests = []
+    started = time.perf_counter()
+    for i in range(int(rate * duration)):
+        scheduled = started + i / rate
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        requests.append(
+            asyncio.create_task(timed_get(client, path, latencies, scheduled))
+        )
+    await asyncio.gather(*requests)
+    return latencies
+
+
+async def bench_concurrency(args):
+    """p99 of cheap endpoints while slow video analyses are in flight."""
+
+    async def pooled_analysis(video_path, question=None):
+        # Same shape as the real thing: blocking SDK work on the shared pool.
+        await run_blocking(time.sleep, args.analysis_seconds)
+        return {}, "", ""
+
+    async def blocking_analysis(video_path, question=None):
+        # What the handlers used to do: block the event loop directly.
+        time.sleep(args.analysis_seconds)
+        return {}, "", ""
+
+    transport = httpx.ASGITransport(app=main.app)
+    original = main.analyze_video
+    try:
+        for label, stub in (
+            ("event-loop blocking", blocking_analysis),
+            ("thread pool", pooled_analysis),
+        ):
+            main.analyze_video = stub
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://bench"
+            ) as client:
+                analyses = [
+                    asyncio.create_task(
+                        client.post(
+                            "/analyze-video",
+                            files={"video": ("answer.mp4", b"\0" * 1024)},
+                            data={
+                                "question": "q",
+                                "company": "c",
+                                "question_count": "1",
+                            },
+                        )
+                    )
+                    for _ in range(args.analyses)
+                ]
+                latencies = await open_loop(
+                    client,
+                    "/openapi.json",
+                    args.rate,
+                    args.analyses * args.analysis_seconds,
+                )
+                await asyncio.gather(*analyses)
+            report(f"/openapi.json ({label})", latencies)
+    finally:
+        main.analyze_video = original
+
+
+async def bench_upload_memory(args):
+    """Peak Python heap while large synthetic videos are uploaded in parallel."""
+
+    async def noop_analysis(video_path, question=None):
+        return {}, "", ""
+
+    async def whole_read(upload, destination, max_bytes):
+        # What the endpoints used to do: read the whole upload, then write it.
+        content = await upload.read()
+        with open(destination, "wb") as f:
+            f.write(content)
+        return len(content), None
+
+    with tempfile.TemporaryDirectory() as workdir:
+        videos = []
+        for i in range(args.uploads):
+            path = os.path.join(workdir, f"video{i}.mp4")
+            with open(path, "wb") as f:
+                for _ in range(args.video_mb):
+                    f.write(os.urandom(1024 * 1024))
+            videos.append(path)
+
+        transport = httpx.ASGITransport(app=main.app)
+        original_analysis, original_save = main.analyze_video, main.save_upload
+        main.analyze_video = noop_analysis
+        try:
+            for label, save in (
+                ("whole read", whole_read),
+                ("streamed", original_save),
+            ):
+                main.save_upload = save
+                async with httpx.AsyncClient(
+                    transport=transport, base_url="http://bench", timeout=None
+                ) as client:
+                    handles = [open(path, "rb") for path in videos]
+                    tracemalloc.start()
+                    started = time.perf_counter()
+                    try:
+                        responses = await asyncio.gather(
+                            *(
+                                client.post(
+                                    "/analyze-video",
+                                    files={"video": ("answer.mp4", handle)},
+                                    data={
+                                        "question": "q",
+                                        "company": "c",
+                                        "question_count": "1",
+                                    },
+                                )
+                                for handle in handles
+                            )
+                        )
+                        elapsed = time.perf_counter() - started
+                        _, peak = tracemalloc.get_traced_memory()
+                    finally:
+                        tracemalloc.stop()
+                        for handle in handles:
+                            handle.close()
+                for response in responses:
+                    response.raise_for_status()
+                print(
+                    f"{label:<12} {args.uploads} x {args.video_mb}MB "
+                    f"peak heap={peak / 2**20:8.1f}MB time={elapsed:6.2f}s"
+                )
+        finally:
+            main.analyze_video, main.save_upload = original_analysis, original_save
+
+
+async def bench_companies(args):
+    """Requests per second for /companies, parsing per request vs indexed."""
+
+    async def parse_per_request():
+        # What /companies used to do on every call
+        df = await run_blocking(pd.read_excel, main.COMPANY_DATA_FILE)
+        return {"companies": sorted(df["company"].unique().tolist())}
+
+    main.app.add_api_route("/bench/companies-uncached", parse_per_request)
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=main.app), base_url="http://bench"
+    ) as client:
+        etag = (await client.get("/companies")).headers["etag"]
+        for label, path, headers in (
+            ("read_excel per request", "/bench/companies-uncached", {}),
+            ("in-memory index", "/companies", {}),
+            ("in-memory index, 304", "/companies", {"If-None-Match": etag}),
+        ):
+            started = time.perf_counter()
+            for _ in range(args.requests):
+                response = await client.get(path, headers=headers)
+                assert response.status_code in (200, 304)
+            elapsed = time.perf_counter() - started
+            print(f"{label:<24} {args.requests / elapsed:10.1f} req/s")
+
+
+def bench_company_search(args):
+    """Search latency over a synthetic index of many companies."""
+    rng = random.Random(0)
+    words = [
+        "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))).title()
+        for _ in range(5000)
+    ]
+    names = {
+        " ".join(rng.choices(words, k=rng.randint(1, 3))) for _ in range(args.companies)
+    }
+    started = time.perf_counter()
+    index = CompanyIndex(pd.DataFrame({"company": sorted(names)}))
+    print(
+        f"built index of {len(names)} companies in {time.perf_counter() - started:.2f}s"
+    )
+
+    def typo(word):
+        position = rng.randrange(len(word))
+        return word[:position] + word[position + 1 :]
+
+    queries = {
+        "prefix": [rng.choice(words)[: rng.randint(1, 4)] for _ in range(1000)],
+        "typo": [typo(rng.choice(words)) for _ in range(1000)],
+    }
+    for label, batch in queries.items():
+        latencies = []
+        for query in batch:
+            started = time.perf_counter()
+            index.search(query, limit=20)
+            latencies.append(time.perf_counter() - started)
+        report(f"search ({label})", latencies)
+
+
+class StubModel:
+    """Stands in for ``genai.GenerativeModel`` with a fixed response delay.
+
+    With ``serialize`` set, calls queue behind each other, which reproduces
+    code that awaited one LLM call before starting the next.
+    """
+
+    def __init__(self, delay, text="stub response", serialize=False):
+        self.delay = delay
+        self.text = text
+        self.calls = 0
+        self._lock = asyncio.Lock() if serialize else None
+
+    async def generate_content_async(self, contents, **kwargs):
+        self.calls += 1
+        if self._lock is None:
+            await asyncio.sleep(self.delay)
+        else:
+            async with self._lock:
+                await asyncio.sleep(self.delay)
+        return types.SimpleNamespace(text=self.text)
+
+
+def next_question_form(history=None):
+    return {
+        "previous_question": "q",
+        "company": "c",
+        "question_count": "1",
+        "interview_history": json.dumps(history or []),
+    }
+
+
+async def bench_final_report(args):
+    """End-of-interview latency of /next-question against a stubbed model."""
+
+    async def failing_analysis(video_path, question=None):
+        # Low scores end the interview
+        scores = dict.fromkeys(
+            [
+                "technical_accuracy",
+                "communication_clarity",
+                "body_language",
+                "eye_contact",
+                "speaking_pace",
+            ],
+            1,
+        )
+        return scores, "feedback", "answer"
+
+    original_model, original_analysis = main.model, main.analyze_video
+    main.analyze_video = failing_analysis
+    main.app.dependency_overrides[main.get_current_user] = lambda: {"username": "bench"}
+    try:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=main.app),
+            base_url="http://bench",
+            timeout=None,
+        ) as client:
+            for label, serialize in (("sequential", True), ("concurrent", False)):
+                main.model = StubModel(args.llm_seconds, serialize=serialize)
+                latencies = []
+                for _ in range(args.interviews):
+                    started = time.perf_counter()
+                    response = await client.post(
+                        "/next-question",
+                        files={"video": ("answer.mp4", b"\0" * 1024)},
+                        data=next_question_form(),
+                    )
+                    response.raise_for_status()
+                    assert response.json()["done"]
+                    latencies.append(time.perf_counter() - started)
+                report(f"final report ({label})", latencies)
+    finally:
+        main.model, main.analyze_video = original_model, original_analysis
+        main.app.dependency_overrides.clear()
+
+
+class StubCollection:
+    """Just enough of a Motor collection for the interview session store."""
+
+    def __init__(self):
+        self.documents = {}
+
+    async def create_index(self, *args, **kwargs):
+        pass
+
+    async def insert_one(self, document):
+        self.documents[document["_id"]] = json.loads(json.dumps(document, default=str))
+
+    async def find_one(self, query, projection=None):
+        return self.documents.get(query["_id"])
+
+    async def update_one(self, query, update):
+        document = self.documents.get(query["_id"])
+        if document is None or any(document.get(k) != v for k, v in query.items()):
+            return types.SimpleNamespace(matched_count=0)
+        document.update(json.loads(json.dumps(update.get("$set", {}), default=str)))
+        for key, value in update.get("$inc", {}).items():
+            document[key] += value
+        for key, value in update.get("$push", {}).items():
+            document[key].append(value)
+        return types.SimpleNamespace(matched_count=1)
+
+
+async def bench_session_payload(args):
+    """Bytes per /next-question turn, whole history vs a server-side session."""
+
+    async def passing_analysis(video_path, question=None):
+        scores = dict.fromkeys(
+            [
+                "technical_accuracy",
+                "communication_clarity",
+                "body_language",
+                "eye_contact",
+                "speaking_pace",
+            ],
+            5,
+        )
+        return scores, "feedback " * 100, "answer " * 150
+
+    original = (main.model, main.analyze_video, main.interview_sessions.collection)
+    main.model = StubModel(0, text="next question")
+    main.analyze_video = passing_analysis
+    main.interview_sessions.collection = StubCollection()
+    main.question_prefetcher.enabled = False
+    main.app.dependency_overrides[main.get_current_user] = lambda: {"username": "bench"}
+    try:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=main.app),
+            base_url="http://bench",
+            timeout=None,
+        ) as client:
+            for label in ("interview_history", "session_id"):
+                session = await main.interview_sessions.create("bench", "c", "q")
+                history = []
+                sent, received = [], []
+                started = time.perf_counter()
+                for _ in range(args.turns):
+                    if label == "session_id":
+                        data = {"session_id": session["_id"]}
+                    else:
+                        data = next_question_form(history)
+                    request = client.build_request(
+                        "POST",
+                        "/next-question",
+                        files={"video": ("answer.mp4", b"\0" * 1024)},
+                        data=data,
+                    )
+                    sent.append(len(request.read()))
+                    response = await client.send(request)
+                    response.raise_for_status()
+                    received.append(len(response.content))
+                    history = response.json().get("interview_history", history)
+                elapsed = time.perf_counter() - started
+                print(
+                    f"{label:<18} request bytes: turn 1 {sent[0]}, "
+                    f"turn {args.turns} {sent[-1]}, total {sum(sent)}; "
+                    f"response bytes total {sum(received)}; "
+                    f"{elapsed / args.turns * 1000:.1f}ms/turn"
+                )
+    finally:
+        main.model, main.analyze_video, main.interview_sessions.collection = original
+        main.question_prefetcher.enabled = True
+        main.app.dependency_overrides.clear()
+
+
+async def bench_prompt_size(args):
+    """Estimated final report prompt tokens, full history vs compacted."""
+    turn = {
+        "question": "Explain how you would design a rate limiter " * 2,
+        "answer": "I would start with a token bucket per client " * 30,
+        "feedback": "Clear structure, but missed the distributed case " * 5,
+        "scores": dict.fromkeys(interview_summary.SCORE_DIMENSIONS, 4),
+    }
+
+    async def summarize(prompt, cache=None):
+        # A summary of the maximum length
+        return "word " * compaction.HISTORY_SUMMARY_WORDS
+
+    summarizer = compaction.HistorySummarizer(summarize)
+    main.prompt_sizes = main.PromptSizeStats()
+    for turns in sorted({1, 5, args.turns, args.turns * 5}):
+        session = {"turns": 0, "history": [], **interview_summary.empty_summary()}
+        for _ in range(turns):
+            folded = await summarizer.roll(interview_summary.fold_turn(session, turn))
+            session = {
+                "turns": session["turns"] + 1,
+                "history": [*session["history"], turn],
+                **folded,
+            }
+        started = time.perf_counter()
+        analysis_prompt, _, _ = main.final_report_prompts(
+            session, session["history"], "c"
+        )
+        elapsed = time.perf_counter() - started
+        print(
+            f"{turns:>4} turns: analysis prompt ~"
+            f"{compaction.estimate_tokens(analysis_prompt)} tokens "
+            f"({elapsed * 1000:.1f}ms to build)"
+        )
+    print(json.dumps(main.prompt_sizes.stats(), indent=2))
+    print(json.dumps(summarizer.stats(), indent=2))
+
+
+def synthetic_answer_video(path, seconds=10, width=1280, height=720, fps=30):
+    """A noisy 720p clip, roughly as hard to compress as a webcam recording."""
+    writer = cv2.VideoWriter(
+        path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height)
+    )
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    for index in range(seconds * fps):
+        frame = np.roll(background, index * 4, axis=1)
+        cv2.circle(frame, (width // 2, height // 2), 100 + index % 30, (0, 0, 0), -1)
+        writer.write(frame)
+    writer.release()
+
+
+async def bench_video_preprocess(args):
+    """Bytes uploaded and time added by downscaling answer videos."""
+    with tempfile.TemporaryDirectory() as directory:
+        source = args.video
+        if source is None:
+            source = os.path.join(directory, "answer.mp4")
+            synthetic_answer_video(source)
+        preprocessor = video_preprocessing.VideoPreprocessor(enabled=True)
+        started = time.perf_counter()
+        latencies = []
+
+        async def one(index):
+            began = time.perf_counter()
+            await preprocessor.prepare(
+                source,
+                os.path.join(directory, f"small-{index}.mp4"),
+                os.path.join(directory, f"audio-{index}.wav"),
+            )
+            latencies.append(time.perf_counter() - began)
+
+        try:
+            await asyncio.gather(*(one(index) for index in range(args.uploads)))
+        finally:
+            video_preprocessing.video_pool.shutdown()
+        elapsed = time.perf_counter() - started
+        report(f"preprocess ({args.uploads} concurrent)", latencies)
+        print(f"{args.uploads / elapsed:.2f} videos/s")
+        print(json.dumps(preprocessor.stats(), indent=2))
+
+
+async def bench_answer_upload(args):
+    """Wait after the candidate stops recording, whole upload vs pieces.
+
+    The client's upstream bandwidth is simulated by sleeping for the time the
+    bytes would take to send; pieces sent while recording cost no waiting.
+    """
+    piece = os.urandom(256 * 1024)
+    pieces = max(1, args.video_mb * 4)
+
+    async def throttled(size):
+        await asyncio.sleep(size * 8 / (args.upload_mbps * 1_000_000))
+
+    async def analysis(video_path, question=None):
+        await asyncio.sleep(args.analysis_seconds)
+        scores = dict.fromkeys(interview_summary.SCORE_DIMENSIONS, 4)
+        return scores, "feedback", "answer"
+
+    original = (main.model, main.analyze_video, main.answer_uploads.analyze)
+    collection = main.interview_sessions.collection
+    main.model = StubModel(0, text="next question")
+    main.analyze_video = main.answer_uploads.analyze = analysis
+    main.interview_sessions.collection = StubCollection()
+    main.question_prefetcher.enabled = False
+    main.app.dependency_overrides[main.get_current_user] = lambda: {"username": "bench"}
+    try:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=main.app),
+            base_url="http://bench",
+            timeout=None,
+        ) as client:
+            for label in ("whole video", "pieces"):
+                latencies = []
+                for _ in range(args.interviews):
+                    session = await main.interview_sessions.create("bench", "c", "q")
+                    data = {"session_id": session["_id"]}
+                    files = None
+                    if label == "pieces":
+                        upload = await client.post("/answer-uploads", data=data)
+                        upload_id = upload.json()["upload_id"]
+                        for index in range(pieces - 1):
+                            response = await client.put(
+                                f"/answer-uploads/{upload_id}",
+                                params={"offset": index * len(piece)},
+                                content=piece,
+                            )
+                            response.raise_for_status()
+                    stopped = time.perf_counter()
+                    if label == "pieces":
+                        await throttled(len(piece))
+                        response = await client.put(
+                            f"/answer-uploads/{upload_id}",
+                            params={"offset": (pieces - 1) * len(piece)},
+                            content=piece,
+                        )
+                        response.raise_for_status()
+                        await client.post(f"/answer-uploads/{upload_id}/finish")
+                        data["upload_id"] = upload_id
+                    else:
+                        await throttled(pieces * len(piece))
+                        files = {"video": ("answer.webm", piece * pieces)}
+                    response = await client.post(
+                        "/next-question", data=data, files=files
+                    )
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - stopped)
+                report(f"wait after stop ({label})", latencies)
+    finally:
+        main.model, main.analyze_video, main.answer_uploads.analyze = original
+        main.interview_sessions.collection = collection
+        main.question_prefetcher.enabled = True
+        main.app.dependency_overrides.clear()
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """Word-level edit distance over the number of reference words."""
+    expected = reference.lower().split()
+    heard = hypothesis.lower().split()
+    previous = list(range(len(heard) + 1))
+    for i, word in enumerate(expected, start=1):
+        current = [i]
+        for j, other in enumerate(heard, start=1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (word != other),
+                )
+            )
+        previous = current
+    return previous[-1] / max(1, len(expected))
+
+
+def bench_transcription(args):
+    """Speed and word error rate of local speech recognition on sample clips."""
+    if not args.clips:
+        raise SystemExit("--clips DIR is required")
+    clips = sorted(
+        os.path.join(args.clips, name)
+        for name in os.listdir(args.clips)
+        if not name.endswith(".txt")
+    )
+    started = time.perf_counter()
+    transcription.load_model(args.stt_backend)
+    print(f"model loaded in {time.perf_counter() - started:.1f}s (once per worker)")
+    total_audio = total_seconds = 0.0
+    rates = []
+    with tempfile.TemporaryDirectory() as directory:
+        for clip in clips:
+            audio = clip
+            if not clip.endswith(".wav"):
+                audio = os.path.join(directory, "audio.wav")
+                video_preprocessing.preprocess_video_sync(
+                    clip, os.path.join(directory, "video.mp4"), audio
+                )
+            started = time.perf_counter()
+            text = transcription.transcribe_sync(audio, args.stt_backend)
+            elapsed = time.perf_counter() - started
+            duration = transcription.audio_seconds(audio)
+            total_audio += duration
+            total_seconds += elapsed
+            line = (
+                f"{os.path.basename(clip):<30} {duration:6.1f}s audio "
+                f"in {elapsed:6.2f}s (x{elapsed / duration:.2f})"
+            )
+            reference = os.path.splitext(clip)[0] + ".txt"
+            if os.path.exists(reference):
+                with open(reference) as f:
+                    rate = word_error_rate(f.read(), text)
+                rates.append(rate)
+                line += f" WER {rate:.1%}"
+            print(line)
+    print(
+        f"{args.stt_backend}: {len(clips)} clips, real-time factor "
+        f"{total_seconds / max(total_audio, 1e-9):.2f}"
+        + (f", mean WER {statistics.mean(rates):.1%}" if rates else "")
+    )
+
+
+async def bench_vision(args):
+    """Frames per second per core of the local face, gaze and motion analysis."""
+    with tempfile.TemporaryDirectory() as directory:
+        source = args.video
+        if source is None:
+            source = os.path.join(directory, "answer.mp4")
+            synthetic_answer_video(source)
+        local = vision.LocalVision(mode="merge")
+        # One run first, so process start-up isn't counted
+        await local.analyze(source)
+        local = vision.LocalVision(mode="merge")
+        started = time.perf_counter()
+        try:
+            results = await asyncio.gather(
+                *(local.analyze(source) for _ in range(args.uploads))
+            )
+        finally:
+            vision.vision_pool.shutdown()
+        elapsed = time.perf_counter() - started
+    frames = sum(result["frames_read"] for result in results)
+    sampled = sum(result["frames"] for result in results)
+    workers = min(vision.VISION_POOL_SIZE, args.uploads)
+    print(
+        f"{args.uploads} videos on {workers} workers in {elapsed:.2f}s: "
+        f"{frames / elapsed / workers:.0f} frames/s per core "
+        f"({sampled / elapsed / workers:.1f} sampled frames/s per core)"
+    )
+    print(json.dumps(results[0], indent=2))
+
+
+async def bench_llm_cache(args):
+    """Upstream calls and latency of repeated question generation."""
+    companies = (await main.company_index.get()).companies[:10]
+    rng = random.Random(0)
+    stub = StubModel(args.llm_seconds, text='["q1", "q2"]')
+    original = main.model
+    try:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=main.app),
+            base_url="http://bench",
+            timeout=None,
+        ) as client:
+            for label, model in (
+                ("uncached", stub),
+                ("cached", llm_cache.LLMCache(stub, ttls={})),
+            ):
+                main.model = model
+                stub.calls = 0
+                latencies = []
+                for _ in range(args.requests):
+                    # A handful of companies and samples, as a cohort would pick
+                    body = {
+                        "company": rng.choice(companies),
+                        "num_questions": 2,
+                        "seed": rng.randrange(3),
+                    }
+                    started = time.perf_counter()
+                    response = await client.post(
+                        "/generate-questions-from-data", json=body
+                    )
+                    latencies.append(time.perf_counter() - started)
+                    assert response.status_code in (200, 404)
+                report(f"generate-questions ({label})", latencies)
+                print(f"{'':<28} upstream calls {stub.calls}/{args.requests}")
+                if label == "cached":
+                    print(json.dumps(model.stats()["endpoints"], indent=2))
+    finally:
+        main.model = original
+
+
+async def bench_single_flight(args):
+    """Upstream calls for a burst of identical question generation requests."""
+    company = (await main.company_index.get()).companies[0]
+    body = {"company": company, "num_questions": 2, "seed": 1}
+    original = main.model
+    try:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=main.app),
+            base_url="http://bench",
+            timeout=None,
+        ) as client:
+            for label, single_flight in (("separate calls", False), ("merged", True)):
+                stub = StubModel(args.llm_seconds, text='["q1", "q2"]')
+                # Caching off, so only coalescing can save calls
+                main.model = llm_cache.LLMCache(
+                    stub, ttl=0, ttls={}, single_flight=single_flight
+                )
+                latencies = []
+
+                async def one():
+                    started = time.perf_counter()
+                    response = await client.post(
+                        "/generate-questions-from-data", json=body
+                    )
+                    latencies.append(time.perf_counter() - started)
+                    response.raise_for_status()
+
+                await asyncio.gather(*(one() for _ in range(args.requests)))
+                report(f"burst of {args.requests} ({label})", latencies)
+                stats = main.model.stats()
+                print(
+                    f"{'':<28} upstream calls {stub.calls}, "
+                    f"merged {stats['merged_calls']}"
+                )
+    finally:
+        main.model = original
+
+
+async def bench_login(args):
+    """Login throughput, and latency of a cheap endpoint during a login burst."""
+    hashed = passwords.hash_password_sync("password")
+
+    class StubUsers:
+        async def find_one(self, query, projection=None):
+            return {"username": query["username"], "password": hashed}
+
+    async def inline_verify(password, hashed):
+        # What /token used to do: bcrypt straight on the event loop
+        return passwords.verify_password_sync(password, hashed)
+
+    started = time.perf_counter()
+    passwords.verify_password_sync("password", hashed)
+    verify_seconds = time.perf_counter() - started
+    # Start the worker processes before measuring
+    await asyncio.gather(
+        *(
+            passwords.verify_password("password", hashed)
+            for _ in range(passwords.PASSWORD_POOL_SIZE)
+        )
+    )
+    print(
+        f"bcrypt verify {verify_seconds * 1000:.0f}ms, "
+        f"pool of {passwords.PASSWORD_POOL_SIZE} processes"
+    )
+
+    async def login(client, number, latencies):
+        started = time.perf_counter()
+        response = await client.post(
+            "/token", data={"username": f"user{number}", "password": "password"}
+        )
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+
+    original_users, original_verify = main.users_collection, main.verify_password
+    main.users_collection = StubUsers()
+    try:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=main.app),
+            base_url="http://bench",
+            timeout=None,
+        ) as client:
+            for label, verify in (
+                ("event loop", inline_verify),
+                ("process pool", passwords.verify_password),
+            ):
+                main.verify_password = verify
+                login_latencies = []
+                started = time.perf_counter()
+                logins = [
+                    asyncio.create_task(login(client, i, login_latencies))
+                    for i in range(args.logins)
+                ]
+                other_latencies = await open_loop(
+                    client,
+                    "/openapi.json",
+                    args.rate,
+                    args.logins * verify_seconds / passwords.PASSWORD_POOL_SIZE,
+                )
+                await asyncio.gather(*logins)
+                elapsed = time.perf_counter() - started
+                print(f"{label}: {args.logins / elapsed:.1f} logins/s")
+                report(f"  /token ({label})", login_latencies)
+                report(f"  /openapi.json ({label})", other_latencies)
+    finally:
+        main.users_collection, main.verify_password = original_users, original_verify
+        passwords.password_pool.shutdown()
+
+
+async def seed_users(collection, count, hashed, batch=10000):
+    existing = await collection.estimated_document_count()
+    if existing >= count:
+        return
+    print(f"seeding {count - existing} users...")
+    for start in range(existing, count, batch):
+        await collection.insert_many(
+            [
+                {"username": f"user{i}", "email": f"user{i}@bench", "password": hashed}
+                for i in range(start, min(start + batch, count))
+            ],
+            ordered=False,
+        )
+
+
+async def bench_user_lookup(args):
+    """Login and profile latency against a large users collection."""
+    client = database.create_client()
+    await database.check_connection(client)
+    users = client[f"{database.MONGODB_DB}_bench"]["users"]
+    # Cheap hashes, so the numbers are about the lookup rather than bcrypt
+    hashed = bcrypt.hashpw(b"password", bcrypt.gensalt(4)).decode()
+    await seed_users(users, args.users, hashed)
+
+    async def timed(client, method, path, latencies, **kwargs):
+        started = time.perf_counter()
+        response = await client.request(method, path, **kwargs)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+
+    original_users = main.users_collection
+    main.users_collection = main.user_cache.collection = users
+    rng = random.Random(0)
+    try:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=main.app),
+            base_url="http://bench",
+            timeout=None,
+        ) as http:
+            for label, indexed in (("no index", False), ("unique index", True)):
+                await users.drop_indexes()
+                if indexed:
+                    await database.ensure_user_indexes(users)
+                logins, profiles = [], []
+                for _ in range(args.lookups):
+                    username = f"user{rng.randrange(args.users)}"
+                    await timed(
+                        http,
+                        "POST",
+                        "/token",
+                        logins,
+                        data={"username": username, "password": "password"},
+                    )
+                    token = main.create_access_token({"sub": username})
+                    await timed(
+                        http,
+                        "GET",
+                        "/profile",
+                        profiles,
+                        headers={"Authorization": f"Bearer {token}"},
+                    )
+                report(f"/token ({label})", logins)
+                report(f"/profile ({label})", profiles)
+    finally:
+        main.users_collection = main.user_cache.collection = original_users
+        passwords.password_pool.shutdown()
+        client.close()
+
+
+def bench_question_bank(args):
+    """Section headings dropped from the shipped question lists."""
+    lists = kept = 0
+    headings = set()
+    broken = []
+    for path in main.QUESTION_DATA_FILES:
+        if not os.path.exists(path):
+            continue
+        df = read_table(path)
+        for company, cell in zip(df["company"], df["questions"]):
+            questions = parse_questions(cell)
+            questions_only = without_section_headings(questions)
+            lists += 1
+            kept += len(questions_only)
+            headings.update(q for q in questions if q not in questions_only)
+            numbers = [item_number(q) for q in questions_only]
+            numbers = [n for n in numbers if n is not None]
+            if numbers != list(range(1, len(numbers) + 1)):
+                broken.append(f"{path}: {company}")
+    print(f"{lists} lists, {kept} questions kept, {len(headings)} headings dropped:")
+    for heading in sorted(headings):
+        print(f"  {heading}")
+    if broken:
+        print("Questions not numbered 1, 2, 3, ... after dropping headings:")
+        for name in broken:
+            print(f"  {name}")
+        raise SystemExit(1)
+
+
+BENCHMARKS = {
+    "concurrency": bench_concurrency,
+    "upload-memory": bench_upload_memory,
+    "companies": bench_companies,
+    "company-search": bench_company_search,
+    "final-report": bench_final_report,
+    "login": bench_login,
+    "user-lookup": bench_user_lookup,
+    "session-payload": bench_session_payload,
+    "prompt-size": bench_prompt_size,
+    "video-preprocess": bench_video_preprocess,
+    "answer-upload": bench_answer_upload,
+    "transcription": bench_transcription,
+    "vision": bench_vision,
+    "llm-cache": bench_llm_cache,
+    "single-flight": bench_single_flight,
+    "question-bank": bench_question_bank,
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--analyses", type=int, default=8)
+    parser.add_argument("--analysis-seconds", type=float, default=0.5)
+    parser.add_argument("--rate", type=float, default=100.0)
+    parser.add_argument("--uploads", type=int, default=4)
+    parser.add_argument("--video-mb", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--companies", type=int, default=50000)
+    parser.add_argument("--llm-seconds", type=float, default=1.0)
+    parser.add_argument("--interviews", type=int, default=5)
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--users", type=int, default=1000000)
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--video")
+    parser.add_argument("--upload-mbps", type=float, default=20.0)
+    parser.add_argument("--clips")
+    parser.add_argument("--stt-backend", default=transcription.STT_BACKEND or "whisper")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = BENCHMARKS[args.benchmark](args)
+    if asyncio.iscoroutine(result):
+        asyncio.run(result)
@@ -0,0 +1,190 @@
+"""Keeps the interview history in the final report prompts within a budget.
+
+The last ``HISTORY_VERBATIM_TURNS`` answers go into the prompt in full, and
+the answers before them as their lines in the session's digest (see
+``interview_summary``). Answers older than the digest are folded into a
+rolling summary as the interview goes: once ``HISTORY_SUMMARY_BATCH`` of
+their lines are waiting, the model merges them into the summary, in the
+background after the turn is answered. Lines still waiting go into the prompt
+as they are.
+
+If the result is over ``HISTORY_TOKEN_BUDGET``, full answers are swapped for
+their digest lines from the oldest on, and then the oldest lines are left out;
+the summary and the score statistics in the prompt still cover every answer.
+
+Tokens are estimated at four characters each, which is close enough for
+English text to budget with and needs no API call.
+"""
+
+import logging
+import os
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+HISTORY_VERBATIM_TURNS = int(os.getenv("HISTORY_VERBATIM_TURNS", "3"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "4000"))
+HISTORY_SUMMARY_BATCH = int(os.getenv("HISTORY_SUMMARY_BATCH", "5"))
+HISTORY_SUMMARY_WORDS = int(os.getenv("HISTORY_SUMMARY_WORDS", "250"))
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+def verbatim_turn(number: int, turn: dict) -> str:
+    scores = turn["scores"]
+    return f"""
+            Question {number}: {turn['question']}
+            Answer: {turn['answer']}
+            Feedback: {turn['feedback']}
+            Scores:
+            - Technical Accuracy: {scores.get('technical_accuracy')}
+            - Communication Clarity: {scores.get('communication_clarity')}
+            - Body Language: {scores.get('body_language')}
+            - Eye Contact: {scores.get('eye_contact')}
+            - Speaking Pace: {scores.get('speaking_pace')}
+            """
+
+
+def _render(
+    question_count: int, summarized: int, summary: str, lines: list, recent: list
+) -> str:
+    parts = []
+    shown = summarized + len(lines) + len(recent)
+    if shown < question_count:
+        parts.append(
+            f"{question_count - shown} answers after the summary are only "
+            "reflected in the statistics."
+        )
+    if summary:
+        parts.append(f"Summary of the first {summarized} answers:\n{summary}")
+    if lines:
+        parts.append("Earlier answers, condensed:\n" + "\n".join(lines))
+    if recent:
+        parts.append("Most recent answers:\n" + "\n".join(recent))
+    return "\n\n".join(parts)
+
+
+def compact_history(
+    history: list,
+    folded: dict,
+    budget: int = HISTORY_TOKEN_BUDGET,
+    verbatim_turns: int = HISTORY_VERBATIM_TURNS,
+) -> str:
+    """The history section of the report prompts, within ``budget`` tokens.
+
+    ``folded`` is the session's condensed state: the summary covers the
+    oldest answers, then come the ``pending`` lines and the ``digest`` lines,
+    whose tail lines up with the tail of ``history``.
+    """
+    question_count = len(history)
+    digest, pending = folded["digest"], folded["pending"]
+    summarized = question_count - len(pending) - len(digest)
+    keep = min(verbatim_turns, question_count, len(digest))
+    recent = deque(
+        verbatim_turn(question_count - keep + i + 1, turn)
+        for i, turn in enumerate(history[question_count - keep :])
+    )
+    lines = deque([*pending, *digest[: len(digest) - keep]])
+
+    def render():
+        return _render(question_count, summarized, folded["summary"], lines, recent)
+
+    text = render()
+    while estimate_tokens(text) > budget and (recent or lines):
+        if recent:
+            # Swap the oldest full answer for its digest line
+            recent.popleft()
+            lines.append(digest[len(digest) - len(recent) - 1])
+        else:
+            lines.popleft()
+        text = render()
+    return text
+
+
+def summary_prompt(summary: str, lines: list) -> str:
+    earlier = f"Summary of the interview so far:\n{summary}\n\n" if summary else ""
+    answers = "\n".join(lines)
+    return f"""You are keeping notes on a mock technical interview for the final report.
+    {earlier}Further answers, one per line:
+    {answers}
+
+    Write an updated summary covering all of the answers above: the topics asked,
+    how well the candidate did on each, and recurring strengths and weaknesses.
+    Use at most {HISTORY_SUMMARY_WORDS} words. Return ONLY the summary."""
+
+
+class HistorySummarizer:
+    """Folds the lines that fell out of a session's digest into its summary."""
+
+    def __init__(self, generate, batch: int = HISTORY_SUMMARY_BATCH):
+        """``generate(prompt, cache=...)`` returns the model's text."""
+        self.generate = generate
+        self.batch = batch
+        self.summaries = 0
+        self.lines_folded = 0
+        self.failures = 0
+
+    async def roll(self, folded: dict) -> dict:
+        """``folded`` with its pending lines merged into the summary, once
+        there are ``batch`` of them. If the model call fails they stay
+        pending and are tried again with the next answer.
+        """
+        pending = folded["pending"]
+        if len(pending) < self.batch:
+            return folded
+        try:
+            summary = await self.generate(
+                summary_prompt(folded["summary"], pending), cache="history-summary"
+            )
+        except Exception:
+            self.failures += 1
+            logger.exception("Could not update the interview summary")
+            return folded
+        summary = summary.strip()
+        if not summary:
+            self.failures += 1
+            return folded
+        self.summaries += 1
+        self.lines_folded += len(pending)
+        return {**folded, "summary": summary, "pending": []}
+
+    def stats(self) -> dict:
+        return {
+            "batch": self.batch,
+            "summaries": self.summaries,
+            "lines_folded": self.lines_folded,
+            "failures": self.failures,
+        }
+
+
+class PromptSizeStats:
+    """Estimated history tokens in the report prompts, before and after."""
+
+    def __init__(self):
+        self.reports = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.max_before = 0
+        self.max_after = 0
+
+    def record(self, before: int, after: int):
+        self.reports += 1
+        self.tokens_before += before
+        self.tokens_after += after
+        self.max_before = max(self.max_before, before)
+        self.max_after = max(self.max_after, after)
+
+    def stats(self) -> dict:
+        if not self.reports:
+            return {"reports": 0}
+        return {
+            "reports": self.reports,
+            "budget": HISTORY_TOKEN_BUDGET,
+            "verbatim_turns": HISTORY_VERBATIM_TURNS,
+            "mean_tokens_before": round(self.tokens_before / self.reports),
+            "mean_tokens_after": round(self.tokens_after / self.reports),
+            "max_tokens_before": self.max_before,
+            "max_tokens_after": self.max_after,
+        }
@@ -0,0 +1,79 @@
+"""MongoDB connection settings and startup checks.
+
+The client is configured from the environment:
+
+    MONGODB_URL                      mongodb://localhost:27017/
+    MONGODB_DB                       interview_prep
+    MONGODB_MAX_POOL_SIZE            100
+    MONGODB_MIN_POOL_SIZE            0
+    MONGODB_SERVER_SELECTION_TIMEOUT 5 (seconds)
+    MONGODB_CONNECT_TIMEOUT          5 (seconds)
+    MONGODB_SOCKET_TIMEOUT           unset (no timeout)
+    MONGODB_WAIT_QUEUE_TIMEOUT       unset (wait for a free connection)
+
+Creating the client doesn't connect. ``check_connection`` is awaited on
+startup so an unreachable database stops the app right away instead of
+failing the first request after the server selection timeout.
+"""
+
+import os
+import re
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import OperationFailure, PyMongoError
+
+MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017/")
+MONGODB_DB = os.getenv("MONGODB_DB", "interview_prep")
+
+
+class DatabaseSetupError(RuntimeError):
+    pass
+
+
+def _milliseconds(name: str, default=None):
+    value = os.getenv(name, default)
+    return None if value in (None, "") else int(float(value) * 1000)
+
+
+def client_options() -> dict:
+    options = {
+        "maxPoolSize": int(os.getenv("MONGODB_MAX_POOL_SIZE", "100")),
+        "minPoolSize": int(os.getenv("MONGODB_MIN_POOL_SIZE", "0")),
+        "serverSelectionTimeoutMS": _milliseconds(
+            "MONGODB_SERVER_SELECTION_TIMEOUT", "5"
+        ),
+        "connectTimeoutMS": _milliseconds("MONGODB_CONNECT_TIMEOUT", "5"),
+        "socketTimeoutMS": _milliseconds("MONGODB_SOCKET_TIMEOUT"),
+        "waitQueueTimeoutMS": _milliseconds("MONGODB_WAIT_QUEUE_TIMEOUT"),
+    }
+    return {key: value for key, value in options.items() if value is not None}
+
+
+def create_client(url: str = MONGODB_URL) -> AsyncIOMotorClient:
+    return AsyncIOMotorClient(url, **client_options())
+
+
+def _redacted(url: str) -> str:
+    # Don't print credentials
+    return re.sub(r"//[^@/]*@", "//***@", url)
+
+
+async def check_connection(client, url: str = MONGODB_URL):
+    """Raises DatabaseSetupError if the server can't be reached."""
+    try:
+        await client.admin.command("ping")
+    except PyMongoError as e:
+        raise DatabaseSetupError(
+            f"Could not reach MongoDB at {_redacted(url)}: {e}"
+        ) from e
+
+
+async def ensure_user_indexes(users_collection):
+    """Usernames are looked up on nearly every request and must be unique."""
+    try:
+        await users_collection.create_index("username", unique=True)
+    except OperationFailure as e:
+        raise DatabaseSetupError(
+            "Could not create the unique index on users.username; "
+            f"remove duplicate usernames first: {e}"
+        ) from e
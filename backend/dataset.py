@@ -0,0 +1,328 @@
+"""In-memory views of the company/question datasets (``data.xlsx``, ``data.csv``).
+
+The spreadsheet is parsed once and kept in memory. ``ReloadingDataset`` checks
+the file's mtime and size at most once per ``check_interval`` and re-parses it
+only if its content hash actually changed, so editing the file on disk is
+picked up without a restart.
+"""
+
+import ast
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from bisect import bisect_left
+
+import numpy as np
+import pandas as pd
+
+from executor import run_blocking
+
+
+def read_table(path) -> pd.DataFrame:
+    if str(path).lower().endswith(".csv"):
+        return pd.read_csv(path)
+    return pd.read_excel(path)
+
+
+# Queries shorter than this only get prefix matches
+FUZZY_MIN_LENGTH = 3
+# Most trigram candidates that are checked with an edit distance
+FUZZY_CANDIDATES = 32
+# The number a question or section heading starts with ("3. Databases")
+ITEM_NUMBER = re.compile(r"(\d+)[.)]\s")
+
+
+def normalize(text: str) -> str:
+    return " ".join(str(text).casefold().split())
+
+
+def trigrams(text: str) -> set:
+    padded = " " + text
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def prefix_matcher(query: str, max_edits: int):
+    """Returns ``distance(text)``: edits from ``query`` to the closest prefix of
+    ``text``, or None if that is more than ``max_edits``.
+
+    Uses Myers' bit-parallel edit distance, one column per character of text,
+    which is several times faster than the textbook DP in pure Python.
+    """
+    length = len(query)
+    masks = {}
+    for i, char in enumerate(query):
+        masks[char] = masks.get(char, 0) | (1 << i)
+    full = (1 << length) - 1
+    last = 1 << (length - 1)
+
+    def distance(text: str):
+        positive, negative = full, 0
+        score = best = length
+        for char in text[: length + max_edits]:
+            eq = masks.get(char, 0)
+            xv = eq | negative
+            xh = (((eq & positive) + positive) ^ positive) | eq
+            horizontal_pos = (negative | ~(xh | positive)) & full
+            horizontal_neg = positive & xh
+            if horizontal_pos & last:
+                score += 1
+            elif horizontal_neg & last:
+                score -= 1
+            horizontal_pos = ((horizontal_pos << 1) | 1) & full
+            horizontal_neg = (horizontal_neg << 1) & full
+            positive = (horizontal_neg | ~(xv | horizontal_pos)) & full
+            negative = horizontal_pos & xv
+            if score < best:
+                best = score
+        return best if best <= max_edits else None
+
+    return distance
+
+
+class CompanyIndex:
+    """Sorted unique companies, with the JSON body pre-rendered.
+
+    Also holds the search index. Normalized names are kept sorted, so the
+    companies whose name starts with a query are one contiguous range found by
+    bisection. The start of every later word gets the same treatment in a
+    second sorted list. A trigram posting list finds candidates for typo-
+    tolerant matching.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.companies = sorted(df["company"].dropna().unique().tolist())
+        self.body = json.dumps({"companies": self.companies}).encode()
+
+        # Search positions are indexes into the companies ordered by
+        # normalized name
+        normalized = [normalize(company) for company in self.companies]
+        self._order = sorted(range(len(normalized)), key=normalized.__getitem__)
+        self._names = [normalized[idx] for idx in self._order]
+
+        words = []
+        grams = {}
+        for position, name in enumerate(self._names):
+            words.extend(
+                (name[i + 1 :], position) for i, char in enumerate(name) if char == " "
+            )
+            for gram in trigrams(name):
+                grams.setdefault(gram, []).append(position)
+        words.sort()
+        self._word_keys = [key for key, _ in words]
+        self._word_owners = np.array([position for _, position in words], np.int64)
+        self._grams = {gram: np.array(p, np.int64) for gram, p in grams.items()}
+
+    def _fuzzy(self, query: str, exclude):
+        """Yields ``(distance, position)`` for names within a few typos."""
+        max_edits = 1 if len(query) <= 5 else 2
+        query_grams = trigrams(query)
+        counts = np.zeros(len(self._names), np.int16)
+        for gram in query_grams:
+            postings = self._grams.get(gram)
+            if postings is not None:
+                counts[postings] += 1
+        for excluded in exclude:
+            counts[excluded] = 0
+
+        # Each edit can destroy at most three of the query's trigrams
+        needed = max(1, len(query_grams) - 3 * max_edits)
+        candidates = np.flatnonzero(counts >= needed)
+        if len(candidates) > FUZZY_CANDIDATES:
+            best = np.argpartition(-counts[candidates], FUZZY_CANDIDATES)
+            candidates = candidates[best[:FUZZY_CANDIDATES]]
+
+        distance = prefix_matcher(query, max_edits)
+        for position in candidates.tolist():
+            name = self._names[position]
+            starts = [0] + [i + 1 for i, char in enumerate(name) if char == " "]
+            distances = [
+                d for d in (distance(name[start:]) for start in starts) if d is not None
+            ]
+            if distances:
+                yield min(distances), position
+
+    def search(self, query: str, limit: int = 20, offset: int = 0):
+        """Case-insensitive prefix search with a typo-tolerant fallback.
+
+        Matches on the start of the name rank first, then matches on the start
+        of a later word, then fuzzy matches by edit distance. Fuzzy matches
+        are always counted, so ``total`` doesn't depend on the page asked
+        for. Returns ``(total, companies)``.
+        """
+        query = normalize(query)
+        if not query:
+            return len(self.companies), self.companies[offset : offset + limit]
+        upper = query + chr(0x10FFFF)
+
+        # Whole-name prefix matches: a contiguous range
+        name_lo = bisect_left(self._names, query)
+        name_hi = bisect_left(self._names, upper, name_lo)
+
+        # Later-word prefix matches, minus names already matched above, each
+        # company once in the order its first matching word sorts
+        word_lo = bisect_left(self._word_keys, query)
+        word_hi = bisect_left(self._word_keys, upper, word_lo)
+        owners = self._word_owners[word_lo:word_hi]
+        owners = owners[(owners < name_lo) | (owners >= name_hi)]
+        _, first = np.unique(owners, return_index=True)
+        word_matches = owners[np.sort(first)]
+
+        matches = list(range(name_lo, name_hi))[offset : offset + limit]
+        word_offset = max(0, offset - (name_hi - name_lo))
+        matches += word_matches[
+            word_offset : word_offset + limit - len(matches)
+        ].tolist()
+        total = (name_hi - name_lo) + len(word_matches)
+
+        if len(query) >= FUZZY_MIN_LENGTH:
+            fuzzy = sorted(self._fuzzy(query, [slice(name_lo, name_hi), word_matches]))
+            fuzzy_offset = max(0, offset - total)
+            matches += [
+                position
+                for _, position in fuzzy[
+                    fuzzy_offset : fuzzy_offset + limit - len(matches)
+                ]
+            ]
+            total += len(fuzzy)
+
+        return total, [self.companies[self._order[position]] for position in matches]
+
+
+class ReloadingDataset:
+    def __init__(self, path, build, check_interval: float = 1.0):
+        """``build`` turns the parsed DataFrame into the object that is served."""
+        self.path = path
+        self.build = build
+        self.check_interval = check_interval
+        self.value = None
+        self.etag = None
+        self.reloads = 0
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _load(self):
+        with open(self.path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        if digest == self.etag:
+            # Touched but not changed
+            return None
+        return digest, self.build(read_table(self.path))
+
+    async def get(self):
+        """Returns the current value, reloading it first if the file changed."""
+        now = time.monotonic()
+        if self.value is not None and now - self._checked_at < self.check_interval:
+            return self.value
+
+        async with self._lock:
+            stat = os.stat(self.path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+            self._checked_at = time.monotonic()
+            if signature != self._signature:
+                loaded = await run_blocking(self._load)
+                if loaded is not None:
+                    self.etag, self.value = loaded
+                    self.reloads += 1
+                self._signature = signature
+        return self.value
+
+
+def parse_questions(cell) -> list:
+    """A cell holds either one question or a Python-style list of them."""
+    if not isinstance(cell, str):
+        return []
+    text = cell.strip()
+    if text.startswith("["):
+        try:
+            return [str(q).strip() for q in ast.literal_eval(text) if str(q).strip()]
+        except (ValueError, SyntaxError):
+            pass
+    return [text] if text else []
+
+
+def item_number(text: str):
+    match = ITEM_NUMBER.match(text)
+    return int(match.group(1)) if match else None
+
+
+def without_section_headings(questions: list) -> list:
+    """``questions`` without the headings that break some lists into sections.
+
+    The questions of a list are numbered 1, 2, 3, ... throughout, and the
+    headings separately ("1. Data Structures", 1., 2., ..., "2. Databases",
+    6., 7., ...), so a heading is a numbered item followed by the number the
+    next question is due to have. A question's wording doesn't matter. Of a
+    question and a heading with the same number, the first is taken for the
+    heading, as a section opens with one.
+    """
+    kept = []
+    due = 1
+    for i, text in enumerate(questions):
+        number = item_number(text)
+        if number is not None:
+            following = questions[i + 1] if i + 1 < len(questions) else ""
+            if item_number(following) == due:
+                continue
+            due = number + 1
+        kept.append(text)
+    return kept
+
+
+class QuestionIndex:
+    """Questions grouped by normalized company name, without the section
+    headings some question lists are broken up by.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        grouped = {}
+        for company, cell in zip(df["company"], df["questions"]):
+            if isinstance(company, str):
+                grouped.setdefault(normalize(company), []).extend(
+                    without_section_headings(parse_questions(cell))
+                )
+        self.questions = {company: tuple(qs) for company, qs in grouped.items()}
+
+
+class QuestionBank:
+    """Samples questions for a company across several question files.
+
+    Each file is a ``ReloadingDataset`` of ``QuestionIndex``, so edits are
+    picked up without a restart. Files that don't exist are skipped.
+    """
+
+    def __init__(self, paths):
+        self.sources = [ReloadingDataset(path, QuestionIndex) for path in paths]
+
+    async def pools(self, company: str) -> list:
+        key = normalize(company)
+        pools = []
+        for source in self.sources:
+            try:
+                index = await source.get()
+            except FileNotFoundError:
+                continue
+            if index.questions.get(key):
+                pools.append(index.questions[key])
+        return pools
+
+    async def sample(self, company: str, k: int, seed=None) -> list:
+        """Up to ``k`` distinct questions, in O(k) whatever the bank's size.
+
+        The same ``seed`` gives the same questions for an unchanged bank.
+        """
+        pools = await self.pools(company)
+        total = sum(len(pool) for pool in pools)
+        rng = random.Random(seed) if seed is not None else random
+        picked = []
+        for position in rng.sample(range(total), min(k, total)):
+            for pool in pools:
+                if position < len(pool):
+                    picked.append(pool[position])
+                    break
+                position -= len(pool)
+        return picked
@@ -0,0 +1,106 @@
+"""Bounded thread pool for the blocking SDK calls made from request handlers,
+and process pools for CPU-bound work.
+
+The Gemini SDK's file APIs and pandas are synchronous. Calling them straight
+from an ``async def`` endpoint stalls the event loop for every other request on
+the worker, so they are pushed through ``run_blocking`` instead.
+
+CPU-bound work (bcrypt, video encoding, frame analysis, speech recognition)
+holds the GIL, so it runs in worker processes instead, each kind in its own
+``ProcessPool``. However many pools there are, at most ``CPU_BUDGET`` of their
+tasks run at once (one per available core by default), so together they don't
+oversubscribe the CPU. A pool created with ``reserved=True`` keeps its workers'
+share of the budget to itself: the other pools share what is left, so its
+short tasks (bcrypt at login) never queue behind their long ones (encodes).
+"""
+
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+BLOCKING_POOL_SIZE = int(os.getenv("BLOCKING_POOL_SIZE", "16"))
+CPU_BUDGET = int(os.getenv("CPU_BUDGET", str(available_cores())))
+
+_executor = ThreadPoolExecutor(
+    max_workers=BLOCKING_POOL_SIZE, thread_name_prefix="blocking"
+)
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Runs ``func(*args, **kwargs)`` on the shared pool and awaits the result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _executor, functools.partial(func, *args, **kwargs)
+    )
+
+
+def shutdown_executor():
+    _executor.shutdown(wait=False, cancel_futures=True)
+
+
+_process_pools = []
+# Slots for the pools without a reservation, made on first use, once every
+# pool (and so every reservation) exists
+_shared_slots = None
+
+
+def _get_shared_slots() -> asyncio.Semaphore:
+    global _shared_slots
+    if _shared_slots is None:
+        reserved = sum(pool.max_workers for pool in _process_pools if pool.reserved)
+        _shared_slots = asyncio.Semaphore(max(1, CPU_BUDGET - reserved))
+    return _shared_slots
+
+
+class ProcessPool:
+    """A process pool of at most ``max_workers`` (and ``CPU_BUDGET``)
+    processes, created on first use so importing the app doesn't start any.
+
+    Workers are started with ``spawn``: forking a process that already runs
+    Motor's and the blocking pool's threads can copy a lock one of them holds
+    into the child and deadlock it.
+    """
+
+    def __init__(self, max_workers: int, reserved: bool = False):
+        self.max_workers = max(1, min(max_workers, CPU_BUDGET))
+        self.reserved = reserved
+        # A reserved pool is only limited by its own size
+        self._slots = asyncio.Semaphore(self.max_workers) if reserved else None
+        self._executor = None
+        _process_pools.append(self)
+
+    def _get(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def run(self, func, *args):
+        """Runs ``func(*args)`` in a worker process once the CPU budget
+        allows, and awaits the result.
+        """
+        async with self._slots or _get_shared_slots():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get(), func, *args)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def shutdown_process_pools():
+    for pool in _process_pools:
+        pool.shutdown()
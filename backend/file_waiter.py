@@ -0,0 +1,132 @@
+"""Waits for uploaded Gemini files to leave the PROCESSING state.
+
+Files are polled with exponential backoff and full jitter, starting with a
+short first poll so small uploads are picked up quickly. Several files are
+waited on concurrently, and the time each one took to become ACTIVE is kept so
+the backoff settings can be tuned from real numbers.
+
+``get_file`` is any callable returning an object with ``state.name`` (the
+Gemini SDK's ``genai.get_file`` in production, a fake in tests). It may be a
+plain function, which is run on the blocking pool, or a coroutine function.
+"""
+
+import asyncio
+import inspect
+import logging
+import random
+import time
+from collections import deque
+
+from executor import run_blocking
+
+logger = logging.getLogger(__name__)
+
+
+class FileActivationError(Exception):
+    """A file ended in a state other than ACTIVE."""
+
+
+class FileActivationTimeout(FileActivationError):
+    """A file was still processing when the deadline passed."""
+
+
+class FileActivationWaiter:
+    def __init__(
+        self,
+        get_file,
+        first_poll: float = 0.5,
+        max_poll: float = 8.0,
+        multiplier: float = 2.0,
+        deadline: float = 300.0,
+        history_size: int = 1000,
+    ):
+        self.get_file = get_file
+        self.first_poll = first_poll
+        self.max_poll = max_poll
+        self.multiplier = multiplier
+        self.deadline = deadline
+        self.time_to_active = deque(maxlen=history_size)
+        self.polls = 0
+        self.failures = 0
+        self.timeouts = 0
+
+    async def _fetch(self, name):
+        self.polls += 1
+        if inspect.iscoroutinefunction(self.get_file):
+            return await self.get_file(name)
+        return await run_blocking(self.get_file, name)
+
+    def _delay(self, attempt: int) -> float:
+        ceiling = min(self.max_poll, self.first_poll * self.multiplier**attempt)
+        # The first poll is never jittered below its floor so quick files are
+        # seen quickly; later polls use full jitter to spread load.
+        if attempt == 0:
+            return ceiling
+        return random.uniform(self.first_poll, ceiling)
+
+    async def _wait_one(self, name, deadline, cancel_event):
+        started = time.monotonic()
+        attempt = 0
+        file = await self._fetch(name)
+        while file.state.name == "PROCESSING":
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.timeouts += 1
+                raise FileActivationTimeout(f"File {name} is still processing")
+            delay = min(self._delay(attempt), remaining)
+            if cancel_event is None:
+                await asyncio.sleep(delay)
+            else:
+                try:
+                    await asyncio.wait_for(cancel_event.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                else:
+                    raise asyncio.CancelledError(f"Wait for file {name} cancelled")
+            attempt += 1
+            file = await self._fetch(name)
+
+        if file.state.name != "ACTIVE":
+            self.failures += 1
+            raise FileActivationError(f"File {name} failed to process")
+
+        elapsed = time.monotonic() - started
+        self.time_to_active.append(elapsed)
+        logger.info("File %s active after %.2fs (%d polls)", name, elapsed, attempt + 1)
+        return file
+
+    async def wait_for_active(self, names, deadline=None, cancel_event=None):
+        """Waits for all ``names`` to become ACTIVE and returns their files.
+
+        ``deadline`` is in seconds from now and defaults to the waiter's own.
+        Setting ``cancel_event`` (or cancelling the calling task) abandons the
+        wait; any other file still being waited on is cancelled as well.
+        """
+        deadline = time.monotonic() + (self.deadline if deadline is None else deadline)
+        tasks = [
+            asyncio.ensure_future(self._wait_one(name, deadline, cancel_event))
+            for name in names
+        ]
+        try:
+            return await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> dict:
+        samples = sorted(self.time_to_active)
+
+        def pct(p):
+            if not samples:
+                return None
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))], 3)
+
+        return {
+            "files": len(samples),
+            "polls": self.polls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "time_to_active_p50": pct(0.5),
+            "time_to_active_p90": pct(0.9),
+            "time_to_active_max": round(samples[-1], 3) if samples else None,
+        }
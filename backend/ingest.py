@@ -0,0 +1,54 @@
+"""Chunked ingest of uploaded files to disk.
+
+Uploads are copied from the request in fixed-size chunks instead of being read
+into memory whole. The size limit is enforced as the bytes are copied and the
+SHA-256 is computed in the same pass, so callers never need to re-read the
+file to hash it.
+"""
+
+import hashlib
+import os
+
+from fastapi import HTTPException, UploadFile
+
+from executor import run_blocking
+
+CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+MAX_RESUME_BYTES = int(os.getenv("MAX_RESUME_BYTES", str(10 * 1024 * 1024)))
+MAX_VIDEO_BYTES = int(os.getenv("MAX_VIDEO_BYTES", str(500 * 1024 * 1024)))
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=413, detail=f"File exceeds the {max_bytes} byte upload limit"
+    )
+
+
+async def save_upload(upload: UploadFile, destination, max_bytes: int, reserve=None):
+    """Streams ``upload`` to ``destination``; returns ``(size, sha256_hex)``.
+
+    ``reserve(nbytes)``, if given, is called before each chunk is written and
+    can refuse it by raising. A partially written file is removed if the
+    limit is exceeded or the copy fails for any other reason.
+    """
+    if upload.size is not None and upload.size > max_bytes:
+        raise _too_large(max_bytes)
+
+    digest = hashlib.sha256()
+    size = 0
+    out = await run_blocking(open, destination, "wb")
+    try:
+        while chunk := await upload.read(CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_bytes:
+                raise _too_large(max_bytes)
+            digest.update(chunk)
+            if reserve is not None:
+                reserve(len(chunk))
+            await run_blocking(out.write, chunk)
+    except BaseException:
+        out.close()
+        os.remove(destination)
+        raise
+    out.close()
+    return size, digest.hexdigest()
@@ -0,0 +1,130 @@
+"""Running score statistics and a condensed history for an interview.
+
+Both are updated once per answered question in constant time and kept on the
+interview session, so the end-of-interview report neither walks the whole
+history nor grows with the number of questions:
+
+- ``metrics`` holds, per score dimension, the count, mean, min, max and the
+  sum of squared deviations (Welford's online algorithm) for the variance.
+- ``digest`` holds one short line per answer, truncated field by field, for
+  the most recent ``DIGEST_TURNS`` answers. Lines that fall out of it wait in
+  ``pending`` until they are folded into ``summary``, a rolling summary of all
+  older answers (see ``compaction``).
+- ``history_tokens`` is the estimated size of the whole history written out
+  in full, for reporting how much compaction saves.
+"""
+
+import os
+
+from compaction import estimate_tokens, verbatim_turn
+
+SCORE_DIMENSIONS = (
+    "technical_accuracy",
+    "communication_clarity",
+    "body_language",
+    "eye_contact",
+    "speaking_pace",
+)
+
+DIGEST_TURNS = int(os.getenv("INTERVIEW_DIGEST_TURNS", "20"))
+DIGEST_FIELD_CHARS = int(os.getenv("INTERVIEW_DIGEST_FIELD_CHARS", "200"))
+
+
+def empty_metrics() -> dict:
+    return {
+        dimension: {"count": 0, "mean": 0.0, "m2": 0.0, "min": None, "max": None}
+        for dimension in SCORE_DIMENSIONS
+    }
+
+
+def add_scores(metrics: dict, scores: dict) -> dict:
+    """``metrics`` with one more answer's scores folded in (a new dict)."""
+    updated = {}
+    for dimension in SCORE_DIMENSIONS:
+        stats = dict(metrics[dimension])
+        value = scores.get(dimension)
+        if isinstance(value, (int, float)):
+            stats["count"] += 1
+            delta = value - stats["mean"]
+            stats["mean"] += delta / stats["count"]
+            stats["m2"] += delta * (value - stats["mean"])
+            stats["min"] = value if stats["min"] is None else min(stats["min"], value)
+            stats["max"] = value if stats["max"] is None else max(stats["max"], value)
+        updated[dimension] = stats
+    return updated
+
+
+def average_scores(metrics: dict) -> dict:
+    """Mean per dimension, the ``overall_metrics`` shown on the dashboard."""
+    return {dimension: stats["mean"] for dimension, stats in metrics.items()}
+
+
+def score_statistics(metrics: dict) -> dict:
+    return {
+        dimension: {
+            "count": stats["count"],
+            "mean": round(stats["mean"], 3),
+            "min": stats["min"],
+            "max": stats["max"],
+            "variance": (
+                round(stats["m2"] / stats["count"], 3) if stats["count"] else None
+            ),
+        }
+        for dimension, stats in metrics.items()
+    }
+
+
+def _clip(text) -> str:
+    text = " ".join(str(text).split())
+    if len(text) <= DIGEST_FIELD_CHARS:
+        return text
+    return text[: DIGEST_FIELD_CHARS - 1].rstrip() + "…"
+
+
+def digest_line(number: int, turn: dict) -> str:
+    scores = ", ".join(
+        f"{dimension.replace('_', ' ')} {turn['scores'].get(dimension)}"
+        for dimension in SCORE_DIMENSIONS
+    )
+    return (
+        f"Q{number}: {_clip(turn['question'])} | Answer: {_clip(turn['answer'])} "
+        f"| Feedback: {_clip(turn['feedback'])} | Scores: {scores}"
+    )
+
+
+def empty_summary() -> dict:
+    """The condensed state of an interview with no answers yet."""
+    return {
+        "metrics": empty_metrics(),
+        "digest": [],
+        "pending": [],
+        "summary": "",
+        "history_tokens": 0,
+    }
+
+
+def _add_turn(state: dict, number: int, turn: dict) -> dict:
+    digest = [*state["digest"], digest_line(number, turn)]
+    return {
+        "metrics": add_scores(state["metrics"], turn["scores"]),
+        "digest": digest[-DIGEST_TURNS:],
+        "pending": [*state["pending"], *digest[:-DIGEST_TURNS]],
+        "summary": state["summary"],
+        "history_tokens": state["history_tokens"]
+        + estimate_tokens(verbatim_turn(number, turn)),
+    }
+
+
+def fold_turn(session: dict, turn: dict) -> dict:
+    """The session's condensed state (``metrics``, ``digest``, ``pending``,
+    ``summary`` and ``history_tokens``) after ``turn``.
+
+    Sessions that don't have it yet (older sessions, or requests that send
+    the whole history) get it rebuilt from the history once.
+    """
+    state = {key: session.get(key) for key in empty_summary()}
+    if any(value is None for value in state.values()):
+        state = empty_summary()
+        for number, previous in enumerate(session["history"], start=1):
+            state = _add_turn(state, number, previous)
+    return _add_turn(state, session["turns"] + 1, turn)
@@ -0,0 +1,292 @@
+"""Background queue for answer-video analysis.
+
+Submitting a video stores it on disk and inserts a job document into MongoDB,
+then returns straight away. A fixed number of worker tasks claim queued jobs
+and run the analysis, so at most ``workers`` analyses run at once per process.
+
+Claiming a job takes a lease on it, which is renewed while the analysis runs.
+If the process dies mid-analysis the lease runs out and any worker (in this
+process after a restart, or in another one) picks the job up again, up to
+``max_attempts`` times. Each claim is told apart by the job's ``attempts``, so
+a worker that lost its lease can't overwrite the job or delete its video. Job
+state lives in MongoDB and videos in ``video_dir``, so nothing is lost across
+restarts.
+
+Videos are only on the disk of the host they were submitted to, so a job is
+only claimed by workers on that ``host``. If ``video_dir`` is shared storage
+that every host mounts, pass ``host=None`` and any worker claims any job.
+
+A finished job's result can be used for one interview turn only. Finished
+jobs are removed by MongoDB ``retention_seconds`` after they finish.
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+
+from ingest import MAX_VIDEO_BYTES, save_upload
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+TERMINAL_STATES = (DONE, FAILED)
+
+
+class AnalysisJobQueue:
+    def __init__(
+        self,
+        collection,
+        analyze,
+        video_dir,
+        workers: int = 4,
+        lease_seconds: float = 600.0,
+        max_attempts: int = 3,
+        poll_interval: float = 2.0,
+        host=None,
+        retention_seconds: float = 86400.0,
+    ):
+        """``analyze(video_path, params)`` returns ``(scores, feedback, answer)``;
+        ``params`` are the ones the job was submitted with.
+        """
+        self.collection = collection
+        self.analyze = analyze
+        self.video_dir = video_dir
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.host = host
+        self.retention_seconds = retention_seconds
+        self.completed = 0
+        self.failed = 0
+        self.running = 0
+        self.leases_lost = 0
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+
+    async def start(self):
+        os.makedirs(self.video_dir, exist_ok=True)
+        await self.collection.create_index(
+            [("host", 1), ("status", 1), ("created_at", 1)]
+        )
+        # Finished jobs are removed once their expires_at has passed
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+        self._tasks = [
+            asyncio.create_task(self._worker(i)) for i in range(self.workers)
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, username: str, video, params: dict) -> dict:
+        job_id = uuid.uuid4().hex
+        video_path = os.path.join(self.video_dir, f"{job_id}.mp4")
+        await save_upload(video, video_path, MAX_VIDEO_BYTES)
+        now = datetime.utcnow()
+        job = {
+            "_id": job_id,
+            "username": username,
+            "status": QUEUED,
+            "params": params,
+            "video_path": video_path,
+            "host": self.host,
+            "attempts": 0,
+            "created_at": now,
+            "updated_at": now,
+        }
+        await self.collection.insert_one(job)
+        self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str, username: str):
+        return await self.collection.find_one({"_id": job_id, "username": username})
+
+    async def take_result(self, job_id: str, username: str, used_by: dict) -> dict:
+        """Marks a finished job as used by ``used_by`` (the session and turn)
+        and returns it.
+
+        A job used by one turn can't be used by another; the same turn of a
+        stored session may take it again, so a retried submission works.
+        """
+        allowed = [{"used_by": {"$exists": False}}]
+        if used_by.get("session_id"):
+            allowed.append({"used_by": used_by})
+        job = await self.collection.find_one_and_update(
+            {"_id": job_id, "username": username, "status": DONE, "$or": allowed},
+            {"$set": {"used_by": used_by, "updated_at": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if job is not None:
+            return job
+        job = await self.get(job_id, username)
+        if not job:
+            raise HTTPException(status_code=404, detail="Analysis job not found")
+        if job["status"] != DONE:
+            raise HTTPException(
+                status_code=409, detail=f"Analysis job is {job['status']}"
+            )
+        raise HTTPException(
+            status_code=409, detail="Analysis job was already used for an answer"
+        )
+
+    async def _claim(self):
+        now = datetime.utcnow()
+        claimable = {
+            "$or": [
+                {"status": QUEUED},
+                # A worker died holding this job
+                {"status": RUNNING, "lease_until": {"$lt": now}},
+            ]
+        }
+        if self.host is not None:
+            # Jobs from before hosts were recorded have none
+            claimable["host"] = {"$in": [self.host, None]}
+        return await self.collection.find_one_and_update(
+            claimable,
+            {
+                "$set": {
+                    "status": RUNNING,
+                    "lease_until": now + timedelta(seconds=self.lease_seconds),
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    @staticmethod
+    def _owned(job) -> dict:
+        """Matches the job only while this claim of it still holds."""
+        return {"_id": job["_id"], "status": RUNNING, "attempts": job["attempts"]}
+
+    async def _heartbeat(self, job):
+        """Extends the lease on ``job`` until cancelled."""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                renewed = await self.collection.update_one(
+                    self._owned(job),
+                    {
+                        "$set": {
+                            "lease_until": datetime.utcnow()
+                            + timedelta(seconds=self.lease_seconds)
+                        }
+                    },
+                )
+            except Exception:
+                logger.exception("Could not renew the lease on job %s", job["_id"])
+                continue
+            if not renewed.matched_count:
+                self.leases_lost += 1
+                logger.warning("Lost the lease on analysis job %s", job["_id"])
+                return
+
+    async def _finish(self, job, updates: dict):
+        updates["updated_at"] = datetime.utcnow()
+        updates["expires_at"] = updates["updated_at"] + timedelta(
+            seconds=self.retention_seconds
+        )
+        finished = await self.collection.update_one(
+            self._owned(job), {"$set": updates, "$unset": {"lease_until": ""}}
+        )
+        if not finished.matched_count:
+            # Claimed again by another worker, which now owns the video
+            logger.warning("Analysis job %s was taken over; dropping", job["_id"])
+            return False
+        try:
+            os.remove(job["video_path"])
+        except FileNotFoundError:
+            pass
+        return True
+
+    async def _run(self, job):
+        if job["attempts"] > self.max_attempts:
+            if await self._finish(
+                job, {"status": FAILED, "error": "Too many failed attempts"}
+            ):
+                self.failed += 1
+            return
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            scores, feedback, answer = await self.analyze(
+                job["video_path"], job["params"]
+            )
+        except Exception as e:
+            logger.exception("Analysis job %s failed", job["_id"])
+            if job["attempts"] >= self.max_attempts:
+                if await self._finish(job, {"status": FAILED, "error": str(e)}):
+                    self.failed += 1
+            else:
+                await self.collection.update_one(
+                    self._owned(job),
+                    {
+                        "$set": {"status": QUEUED, "error": str(e)},
+                        "$unset": {"lease_until": ""},
+                    },
+                )
+            return
+        finally:
+            heartbeat.cancel()
+        if await self._finish(
+            job,
+            {
+                "status": DONE,
+                "result": {"scores": scores, "feedback": feedback, "answer": answer},
+            },
+        ):
+            self.completed += 1
+
+    async def _worker(self, number: int):
+        while True:
+            # Cleared before claiming so a submit in between still wakes us
+            self._wakeup.clear()
+            try:
+                job = await self._claim()
+            except Exception:
+                logger.exception("Analysis worker %d could not claim a job", number)
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self.running += 1
+            try:
+                await self._run(job)
+            finally:
+                self.running -= 1
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "leases_lost": self.leases_lost,
+        }
+
+
+def public_job(job: dict) -> dict:
+    """The parts of a job document that are returned to its owner."""
+    return {
+        "job_id": job["_id"],
+        "status": job["status"],
+        "attempts": job.get("attempts", 0),
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "result": job.get("result"),
+        "error": job.get("error") if job["status"] == FAILED else None,
+    }
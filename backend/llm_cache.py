@@ -0,0 +1,341 @@
+"""Cache of Gemini responses for repeated prompts.
+
+The same prompts reach the model again and again: the questions generated
+for a company's sample, the opening question for a resume, job description
+and company, a ``/next-question`` retried after a client timeout. ``LLMCache``
+wraps the model and answers those from a cache instead.
+
+Responses are keyed by the model name, its generation config and the
+contents. Text is compared with runs of whitespace collapsed, uploaded files
+by their SHA-256, and file parts (how a resume is attached) by their URI,
+which stays the same while the resume's upload is reused. Entries are kept in memory, least recently used
+first out, and optionally in MongoDB so they survive restarts and are shared
+between processes.
+
+Concurrent identical calls share one request to the model (single flight):
+the first goes upstream and the others wait for its response, so a burst of
+candidates picking the same company, or a double-clicked submit, costs one
+call. This applies to endpoints with caching turned off too; set
+``LLM_SINGLE_FLIGHT=false`` to turn it off. If the shared call fails, every
+caller gets the error; if it is a stream whose reader goes away, the callers
+waiting on it make their own calls.
+
+Callers name the endpoint they call from (``cache="upload"``); each endpoint
+can have its own TTL, and a TTL of 0 turns caching off for it:
+
+    LLM_CACHE_TTL    default TTL in seconds (3600)
+    LLM_CACHE_TTLS   per endpoint, e.g. "final-report=0,generate-questions=86400"
+    LLM_CACHE_SIZE   entries kept in memory (1000)
+
+A cache hit returns an object with the response's ``text``; streamed calls
+get it as a single chunk.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1000"))
+LLM_SINGLE_FLIGHT = os.getenv("LLM_SINGLE_FLIGHT", "true").lower() == "true"
+
+
+def parse_ttls(value: str) -> dict:
+    """``"a=0,b=60"`` as ``{"a": 0.0, "b": 60.0}``."""
+    ttls = {}
+    for item in value.split(","):
+        if "=" in item:
+            endpoint, seconds = item.split("=", 1)
+            ttls[endpoint.strip()] = float(seconds)
+    return ttls
+
+
+LLM_CACHE_TTLS = parse_ttls(os.getenv("LLM_CACHE_TTLS", ""))
+
+
+def _part_key(part):
+    if isinstance(part, str):
+        return " ".join(part.split())
+    if isinstance(part, bytes):
+        return {"bytes": hashlib.sha256(part).hexdigest()}
+    if isinstance(part, dict):
+        return {key: _part_key(value) for key, value in sorted(part.items())}
+    if isinstance(part, (list, tuple)):
+        return [_part_key(item) for item in part]
+    # A part pointing at an uploaded file
+    file_data = getattr(part, "file_data", None)
+    if file_data is not None and file_data.file_uri:
+        return {"file": file_data.file_uri}
+    # An uploaded file
+    sha256 = getattr(part, "sha256_hash", None)
+    if sha256:
+        return {"file_sha256": str(sha256)}
+    name = getattr(part, "name", None) or getattr(part, "uri", None)
+    if name:
+        return {"file": name}
+    return repr(part)
+
+
+def cache_key(model_name: str, generation_config, contents) -> str:
+    parts = contents if isinstance(contents, (list, tuple)) else [contents]
+    payload = json.dumps(
+        {
+            "model": model_name,
+            "config": generation_config or {},
+            "contents": [_part_key(part) for part in parts],
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class CachedResponse:
+    """Stands in for a response (or a one-chunk stream) from the cache."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        yield self
+
+
+class _Abandoned(Exception):
+    """The call that others were waiting on didn't run to the end."""
+
+
+class _RecordingStream:
+    """Passes a streamed response through and hands its text to
+    ``complete`` at the end, or calls ``abandon`` if it doesn't get there.
+    """
+
+    def __init__(self, response, complete, abandon):
+        self.response = response
+        self.complete = complete
+        self.abandon = abandon
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        parts = []
+        try:
+            async for chunk in self.response:
+                try:
+                    parts.append(chunk.text)
+                except ValueError:
+                    pass
+                yield chunk
+        except BaseException:
+            # The stream failed or its reader went away
+            self.abandon()
+            raise
+        await self.complete("".join(parts))
+
+
+class LLMCache:
+    def __init__(
+        self,
+        model,
+        collection=None,
+        ttl: float = LLM_CACHE_TTL,
+        ttls=None,
+        max_entries: int = LLM_CACHE_SIZE,
+        single_flight: bool = LLM_SINGLE_FLIGHT,
+    ):
+        """``collection`` is the optional MongoDB tier."""
+        self.model = model
+        self.collection = collection
+        self.ttl = ttl
+        self.ttls = LLM_CACHE_TTLS if ttls is None else ttls
+        self.max_entries = max_entries
+        # key -> (expires_at, text), least recently used first
+        self._entries = OrderedDict()
+        self.hits = Counter()
+        self.persistent_hits = Counter()
+        self.misses = Counter()
+        self.bypassed = Counter()
+        self.single_flight = single_flight
+        # key -> future of the text of the call in flight
+        self._in_flight = {}
+        self.upstream = Counter()
+        self.merged = Counter()
+
+    @property
+    def model_name(self) -> str:
+        return getattr(self.model, "model_name", type(self.model).__name__)
+
+    async def ensure_indexes(self):
+        if self.collection is not None:
+            # MongoDB removes entries once they expire
+            await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    def ttl_for(self, endpoint) -> float:
+        return self.ttls.get(endpoint, self.ttl)
+
+    async def generate_content_async(
+        self, contents, *, cache=None, stream=False, **kwargs
+    ):
+        """``model.generate_content_async``, answered from the cache if the
+        same call was made recently, or by the same call already in flight.
+        ``cache`` names the calling endpoint.
+        """
+        endpoint = cache or "default"
+        ttl = self.ttl_for(endpoint)
+        config = kwargs.get("generation_config") or getattr(
+            self.model, "_generation_config", None
+        )
+        key = cache_key(self.model_name, config, contents)
+        if ttl > 0:
+            text = await self._lookup(key, endpoint)
+            if text is not None:
+                return CachedResponse(text)
+            self.misses[endpoint] += 1
+        else:
+            self.bypassed[endpoint] += 1
+
+        flight = self._in_flight.get(key) if self.single_flight else None
+        if flight is not None:
+            self.merged[endpoint] += 1
+            try:
+                # Shielded: one caller giving up mustn't cancel it for all
+                return CachedResponse(await asyncio.shield(flight))
+            except _Abandoned:
+                pass
+        return await self._call(key, endpoint, ttl, contents, stream, kwargs)
+
+    async def _call(self, key, endpoint, ttl, contents, stream, kwargs):
+        flight = None
+        if self.single_flight and key not in self._in_flight:
+            flight = asyncio.get_running_loop().create_future()
+            # Nobody may be waiting to see a failure
+            flight.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self._in_flight[key] = flight
+
+        def settle(text=None, error=None):
+            if flight is None or flight.done():
+                return
+            if self._in_flight.get(key) is flight:
+                del self._in_flight[key]
+            if error is None:
+                flight.set_result(text)
+            else:
+                flight.set_exception(error)
+
+        async def complete(text):
+            if ttl > 0 and text:
+                await self._store(key, text, ttl)
+            settle(text)
+
+        self.upstream[endpoint] += 1
+        try:
+            response = await self.model.generate_content_async(
+                contents, stream=stream, **kwargs
+            )
+        except Exception as e:
+            settle(error=e)
+            raise
+        except BaseException:
+            settle(error=_Abandoned())
+            raise
+        if stream:
+            return _RecordingStream(
+                response, complete, lambda: settle(error=_Abandoned())
+            )
+        try:
+            text = response.text
+        except ValueError as e:
+            # Blocked or empty; not worth keeping
+            settle(error=e)
+            return response
+        await complete(text)
+        return response
+
+    async def _lookup(self, key: str, endpoint: str):
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.time():
+                self._entries.move_to_end(key)
+                self.hits[endpoint] += 1
+                return entry[1]
+            del self._entries[key]
+        if self.collection is None:
+            return None
+        try:
+            document = await self.collection.find_one(
+                {"_id": key, "expires_at": {"$gt": datetime.utcnow()}}
+            )
+        except Exception:
+            logger.exception("LLM cache lookup failed")
+            return None
+        if document is None:
+            return None
+        self.persistent_hits[endpoint] += 1
+        expires_at = (
+            time.time() + (document["expires_at"] - datetime.utcnow()).total_seconds()
+        )
+        self._remember(key, expires_at, document["text"])
+        return document["text"]
+
+    def _remember(self, key: str, expires_at: float, text: str):
+        self._entries[key] = (expires_at, text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _store(self, key: str, text: str, ttl: float):
+        self._remember(key, time.time() + ttl, text)
+        if self.collection is None:
+            return
+        try:
+            await self.collection.replace_one(
+                {"_id": key},
+                {
+                    "_id": key,
+                    "text": text,
+                    "model": self.model_name,
+                    "expires_at": datetime.utcnow() + timedelta(seconds=ttl),
+                },
+                upsert=True,
+            )
+        except Exception:
+            logger.exception("Could not store an LLM response")
+
+    def stats(self) -> dict:
+        by_endpoint = {}
+        endpoints = set(self.upstream) | set(self.hits) | set(self.persistent_hits)
+        for endpoint in sorted(endpoints | set(self.merged)):
+            hits = self.hits[endpoint] + self.persistent_hits[endpoint]
+            lookups = hits + self.misses[endpoint]
+            by_endpoint[endpoint] = {
+                "ttl": self.ttl_for(endpoint),
+                "hits": self.hits[endpoint],
+                "persistent_hits": self.persistent_hits[endpoint],
+                "misses": self.misses[endpoint],
+                "bypassed": self.bypassed[endpoint],
+                "hit_rate": round(hits / lookups, 3) if lookups else None,
+                "upstream_calls": self.upstream[endpoint],
+                "merged_calls": self.merged[endpoint],
+            }
+        hits = sum(self.hits.values()) + sum(self.persistent_hits.values())
+        lookups = hits + sum(self.misses.values())
+        return {
+            "entries": len(self._entries),
+            "persistent": self.collection is not None,
+            "hit_rate": round(hits / lookups, 3) if lookups else None,
+            "single_flight": self.single_flight,
+            "in_flight": len(self._in_flight),
+            "upstream_calls": sum(self.upstream.values()),
+            "merged_calls": sum(self.merged.values()),
+            "endpoints": by_endpoint,
+        }
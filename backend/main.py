@@ -1,37 +1,100 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Query
+from fastapi import (
+    FastAPI,
+    UploadFile,
+    File,
+    Form,
+    HTTPException,
+    Depends,
+    Query,
+    Request,
+)
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 import google.generativeai as genai
 import os
 from typing import Dict, Optional, List
 import tempfile
-from pathlib import Path
+import socket
 from dotenv import load_dotenv
 import re
 import json
-from pymongo import MongoClient
-from passlib.context import CryptContext
+import asyncio
+from contextlib import asynccontextmanager
 import jwt
 from datetime import datetime, timedelta
-from pydantic import BaseModel
-from fastapi.responses import FileResponse
+from pydantic import BaseModel, Field
+from fastapi.responses import FileResponse, Response, StreamingResponse
 import time
 import logging
-import pandas as pd
-import random
 from csv import QUOTE_ALL
+from executor import run_blocking, shutdown_executor, shutdown_process_pools
+from file_waiter import FileActivationWaiter
+from resume_cache import ResumeUploadCache, file_part
+from ingest import save_upload, MAX_RESUME_BYTES, MAX_VIDEO_BYTES
+from scratch import ScratchSpace
+from dataset import CompanyIndex, QuestionBank, ReloadingDataset
+from jobs import AnalysisJobQueue, TERMINAL_STATES, public_job
+from streaming import (
+    SSE_HEADERS,
+    StreamTimings,
+    sse_event,
+    stream_generation,
+    stream_text,
+)
+from speculation import QuestionPrefetcher
+from user_cache import UserCache
+from database import (
+    MONGODB_DB,
+    check_connection,
+    create_client,
+    ensure_user_indexes,
+)
+from pymongo.errors import DuplicateKeyError
+from resumes import ResumeStore
+from sessions import ACTIVE, InterviewSessionStore, public_session
+from interview_summary import average_scores, fold_turn, score_statistics
+from answer_uploads import AnswerUploads, public_upload
+from transcription import Transcriber
+from vision import LocalVision
+from llm_cache import LLMCache
+from video_preprocessing import VideoPreprocessor
+from compaction import (
+    HistorySummarizer,
+    PromptSizeStats,
+    compact_history,
+    estimate_tokens,
+)
+from passwords import (
+    LoginRateLimiter,
+    hash_password,
+    verify_password,
+)
 
 load_dotenv()
 
-app = FastAPI()
-
-# MongoDB setup
-client = MongoClient("mongodb://localhost:27017/")
-db = client["interview_prep"]
+# MongoDB setup (connection settings come from the environment)
+client = create_client()
+db = client[MONGODB_DB]
 users_collection = db["users"]
+resumes_collection = db["resumes"]
+
+# User documents, shared across requests for a short while
+user_cache = UserCache(
+    users_collection,
+    ttl=float(os.getenv("USER_CACHE_TTL", "30")),
+    max_entries=int(os.getenv("USER_CACHE_SIZE", "10000")),
+    # Left over on users that haven't been migrated yet
+    projection={"resumes": 0},
+)
+
+# Resumes, one document each
+resume_store = ResumeStore(resumes_collection, users_collection, db["migrations"])
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Optional cap on login attempts per username
+login_limiter = LoginRateLimiter(
+    max_attempts=int(os.getenv("LOGIN_RATE_LIMIT", "0")),
+    window=float(os.getenv("LOGIN_RATE_WINDOW", "60")),
+)
 
 # JWT settings
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key")
@@ -41,6 +104,109 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Scratch space for answer videos and other temporary files
+scratch = ScratchSpace(
+    os.getenv("SCRATCH_DIR", os.path.join(tempfile.gettempdir(), "interview-scratch")),
+    quota_bytes=int(os.getenv("SCRATCH_QUOTA_BYTES", str(5 * 1024**3))),
+    orphan_max_age=float(os.getenv("SCRATCH_ORPHAN_AGE", "3600")),
+)
+SCRATCH_SWEEP_INTERVAL = float(os.getenv("SCRATCH_SWEEP_INTERVAL", "300"))
+
+# Answer videos are downscaled before they are uploaded to Gemini
+video_preprocessor = VideoPreprocessor()
+
+# Answers are transcribed locally if a speech recognition backend is set
+transcriber = Transcriber()
+
+# Eye contact and body language measured locally, blended with the model's
+local_vision = LocalVision()
+
+# Company list, parsed once and reloaded when data.xlsx changes
+COMPANY_DATA_FILE = os.getenv("COMPANY_DATA_FILE", "data.xlsx")
+company_index = ReloadingDataset(COMPANY_DATA_FILE, CompanyIndex)
+
+# Question bank over every question file, indexed by company
+QUESTION_DATA_FILES = os.getenv("QUESTION_DATA_FILES", "data.xlsx,data.csv").split(",")
+question_bank = QuestionBank(QUESTION_DATA_FILES)
+
+
+# Answer videos submitted for analysis in the background
+analysis_jobs = AnalysisJobQueue(
+    db["analysis_jobs"],
+    lambda video_path, params: analyze_video(video_path, params.get("question")),
+    os.getenv("ANALYSIS_JOB_DIR", "analysis_jobs"),
+    workers=int(os.getenv("ANALYSIS_WORKERS", "4")),
+    lease_seconds=float(os.getenv("ANALYSIS_JOB_LEASE", "600")),
+    # Videos stay on this host unless ANALYSIS_JOB_DIR is shared storage
+    host=(
+        None
+        if os.getenv("ANALYSIS_JOB_DIR_SHARED", "false").lower() == "true"
+        else os.getenv("ANALYSIS_JOB_HOST", socket.gethostname())
+    ),
+    retention_seconds=float(os.getenv("ANALYSIS_JOB_RETENTION", "86400")),
+)
+JOB_EVENTS_INTERVAL = 1.0
+
+# Answer videos uploaded piece by piece while they are being recorded
+answer_uploads = AnswerUploads(
+    scratch,
+    lambda video_path, question: analyze_video(video_path, question),
+    idle_timeout=float(os.getenv("ANSWER_UPLOAD_IDLE_TIMEOUT", "900")),
+)
+
+# Time to first chunk and total time of the streaming endpoints
+stream_timings = StreamTimings()
+
+# History tokens in the final report prompts, before and after compaction
+prompt_sizes = PromptSizeStats()
+
+
+async def generate_text(contents, cache: str = "prefetch") -> str:
+    result = await model.generate_content_async(contents, cache=cache)
+    return result.text
+
+
+# Folds answers older than the session digest into a rolling summary
+history_summarizer = HistorySummarizer(generate_text)
+
+
+# Follow-up questions generated while the candidate is still answering
+question_prefetcher = QuestionPrefetcher(
+    generate_text,
+    enabled=os.getenv("QUESTION_PREFETCH", "true").lower() == "true",
+)
+
+
+# Interview state kept between turns
+interview_sessions = InterviewSessionStore(
+    db["interview_sessions"],
+    max_cached=int(os.getenv("INTERVIEW_SESSION_CACHE_SIZE", "1000")),
+    ttl_days=float(os.getenv("INTERVIEW_SESSION_TTL_DAYS", "30")),
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Fails startup if MongoDB is unreachable
+    await check_connection(client)
+    await ensure_user_indexes(users_collection)
+    await resume_store.ensure_indexes()
+    await interview_sessions.ensure_indexes()
+    await llm_cache.ensure_indexes()
+    if os.getenv("MIGRATE_RESUMES", "true").lower() == "true":
+        await resume_store.migrate()
+    sweeper = asyncio.create_task(scratch.run_sweeper(SCRATCH_SWEEP_INTERVAL))
+    await analysis_jobs.start()
+    yield
+    await analysis_jobs.stop()
+    sweeper.cancel()
+    shutdown_executor()
+    shutdown_process_pools()
+    client.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
 
 # Models
 class User(BaseModel):
@@ -65,6 +231,12 @@ class CompanyResponse(BaseModel):
     companies: List[str]
 
 
+class QuestionRequest(BaseModel):
+    company: str
+    num_questions: int = Field(5, ge=1, le=50)
+    seed: Optional[int] = None
+
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -76,7 +248,34 @@ app.add_middleware(
 
 # Configure Gemini AI
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel("gemini-2.0-flash")
+# Every call goes through the response cache, optionally backed by MongoDB
+llm_cache = LLMCache(
+    genai.GenerativeModel("gemini-2.0-flash"),
+    collection=(
+        db["llm_cache"]
+        if os.getenv("LLM_CACHE_PERSIST", "false").lower() == "true"
+        else None
+    ),
+)
+model = llm_cache
+
+# Per-call limit for the end-of-interview reports
+FINAL_REPORT_TIMEOUT = float(os.getenv("FINAL_REPORT_TIMEOUT", "60"))
+FINAL_FEEDBACK_UNAVAILABLE = (
+    "Detailed feedback could not be generated right now. "
+    "Please review the feedback for each answer above."
+)
+
+# Polls uploaded files until Gemini has finished processing them
+file_waiter = FileActivationWaiter(
+    genai.get_file,
+    first_poll=float(os.getenv("FILE_ACTIVE_FIRST_POLL", "0.5")),
+    max_poll=float(os.getenv("FILE_ACTIVE_MAX_POLL", "8")),
+    deadline=float(os.getenv("FILE_ACTIVE_DEADLINE", "300")),
+)
+
+# Reuses Gemini uploads of resumes that were already sent
+resume_cache = ResumeUploadCache(resumes_collection)
 
 
 # Auth functions
@@ -88,39 +287,57 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
+async def load_user(token: str = Depends(oauth2_scheme)) -> dict:
+    """The full user document of the request.
+
+    FastAPI runs a dependency once per request, so everything that depends on
+    this shares one lookup, which itself is usually served by ``user_cache``.
+    """
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username = payload.get("sub")
         if username is None:
             raise HTTPException(status_code=401)
-        user = users_collection.find_one({"username": username})
-        if user:
-            # Convert ObjectId to string and remove password
-            user["_id"] = str(user["_id"])  # Convert ObjectId to string
-            user.pop("password", None)  # Remove password from response
-            return user
+        user = await user_cache.get(username)
     except:
         raise HTTPException(status_code=401)
+    if not user:
+        raise HTTPException(status_code=401)
+    return user
+
+
+async def get_current_user(user: dict = Depends(load_user)):
+    # Convert ObjectId to string and remove password
+    user = {**user, "_id": str(user["_id"])}
+    user.pop("password", None)  # Remove password from response
+    return user
 
 
 # Auth endpoints
 @app.post("/register")
 async def register(user: User):
-    if users_collection.find_one({"username": user.username}):
+    if await users_collection.find_one({"username": user.username}, {"_id": 1}):
         raise HTTPException(status_code=400, detail="Username already registered")
 
-    hashed_password = pwd_context.hash(user.password)
+    hashed_password = await hash_password(user.password)
     user_dict = user.dict()
     user_dict["password"] = hashed_password
-    users_collection.insert_one(user_dict)
+    try:
+        await users_collection.insert_one(user_dict)
+    except DuplicateKeyError:
+        # Registered concurrently since the check above
+        raise HTTPException(status_code=400, detail="Username already registered")
+    user_cache.invalidate(user.username)
     return {"message": "User created successfully"}
 
 
 @app.post("/token")
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = users_collection.find_one({"username": form_data.username})
-    if not user or not pwd_context.verify(form_data.password, user["password"]):
+    login_limiter.check(form_data.username)
+    user = await users_collection.find_one(
+        {"username": form_data.username}, {"username": 1, "password": 1}
+    )
+    if not user or not await verify_password(form_data.password, user["password"]):
         raise HTTPException(status_code=400, detail="Incorrect username or password")
 
     access_token = create_access_token(data={"sub": user["username"]})
@@ -133,37 +350,29 @@ async def get_profile(current_user: dict = Depends(get_current_user)):
 
 
 @app.put("/profile")
-async def update_profile(
-    user_update: UserUpdate, current_user: dict = Depends(get_current_user)
-):
+async def update_profile(user_update: UserUpdate, user: dict = Depends(load_user)):
     updates = {}
     if user_update.email:
         updates["email"] = user_update.email
 
     if user_update.current_password and user_update.new_password:
-        user = users_collection.find_one({"username": current_user["username"]})
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        if not pwd_context.verify(user_update.current_password, user["password"]):
+        if not await verify_password(user_update.current_password, user["password"]):
             raise HTTPException(status_code=400, detail="Incorrect current password")
-        updates["password"] = pwd_context.hash(user_update.new_password)
+        updates["password"] = await hash_password(user_update.new_password)
 
     if updates:
-        users_collection.update_one(
-            {"username": current_user["username"]}, {"$set": updates}
+        await users_collection.update_one(
+            {"username": user["username"]}, {"$set": updates}
         )
+        user_cache.invalidate(user["username"])
 
     return {"message": "Profile updated successfully"}
 
 
-@app.post("/upload")
-async def upload_resume(
-    file: UploadFile = File(...),
-    company: str = Form(...),
-    job_description: str = Form(...),
-    current_user: dict = Depends(get_current_user),
-):
-    temp_file_path = None
+async def prepare_upload_question(
+    file: UploadFile, company: str, job_description: str, username: str
+) -> list:
+    """Saves a new resume and returns the contents for its opening question."""
     file_location = None
     try:
         # Create resumes directory if it doesn't exist
@@ -171,69 +380,263 @@ async def upload_resume(
 
         # Save the file with a unique name
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{current_user['username']}_{timestamp}_{file.filename}"
+        filename = f"{username}_{timestamp}_{file.filename}"
         file_location = f"resumes/{filename}"
 
         # Save the file permanently
-        with open(file_location, "wb+") as file_object:
-            content = await file.read()
-            file_object.write(content)
-            file_object.flush()
+        _, sha256 = await save_upload(file, file_location, MAX_RESUME_BYTES)
 
         # Store resume information in the database
         resume_info = {
             "filename": file.filename,
             "upload_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "file_path": file_location,
+            "sha256": sha256,
         }
 
-        # Update user's resumes in database
-        users_collection.update_one(
-            {"username": current_user["username"]}, {"$push": {"resumes": resume_info}}
-        )
+        await resume_store.add(username, resume_info)
 
-        # Upload file to Gemini for interview question generation
-        resume_file = genai.upload_file(Path(file_location))
+        # Upload file to Gemini (or reuse a live upload of the same file)
+        resume_file = await resume_cache.get_file(username, resume_info)
+    except Exception:
+        # If there's an error, try to clean up the saved file
+        if file_location and os.path.exists(file_location):
+            try:
+                os.remove(file_location)
+            except:
+                pass
+        raise
 
-        # Generate prompt for single question
-        prompt = f"""Based on this resume and the following job description:
+    # Generate prompt for single question
+    prompt = f"""Based on this resume and the following job description:
         {job_description}
         
         Generate ONE technical interview question that might be asked at {company} for this specific role.
         The question should be challenging but appropriate for the candidate's experience level and relevant to the job requirements.
         Return ONLY the question as a string, no additional text or formatting."""
 
+    return [resume_file, "\n\n", prompt]
+
+
+async def start_interview(username: str, company: str, question: str, contents):
+    """Opens a session for the first question; returns the response body."""
+    question_prefetcher.prefetch(username, question, company, context=contents[:1])
+    # Kept so follow-ups can be prefetched with the resume too
+    resume = contents[0].file_data
+    session = await interview_sessions.create(
+        username,
+        company,
+        question,
+        resume_file={"uri": resume.file_uri, "mime_type": resume.mime_type},
+    )
+    return {"question": question, "session_id": session["_id"]}
+
+
+@app.post("/upload")
+async def upload_resume(
+    file: UploadFile = File(...),
+    company: str = Form(...),
+    job_description: str = Form(...),
+    current_user: dict = Depends(get_current_user),
+):
+    try:
+        contents = await prepare_upload_question(
+            file, company, job_description, current_user["username"]
+        )
+
         # Generate response using Gemini
-        result = model.generate_content([resume_file, "\n\n", prompt])
+        result = await model.generate_content_async(contents, cache="upload")
+        question = result.text.strip()
 
-        return {"question": result.text.strip()}
+        return await start_interview(
+            current_user["username"], company, question, contents
+        )
+    except HTTPException:
+        raise
     except Exception as e:
-        # If there's an error, try to clean up the saved file
-        if file_location and os.path.exists(file_location):
-            try:
-                os.remove(file_location)
-            except:
-                pass
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/next-question")
-async def get_next_question(
-    video: UploadFile = File(...),
-    previous_question: str = Form(...),
+@app.post("/upload/stream")
+async def upload_resume_stream(
+    file: UploadFile = File(...),
     company: str = Form(...),
-    question_count: int = Form(...),
-    interview_history: str = Form(...),
+    job_description: str = Form(...),
     current_user: dict = Depends(get_current_user),
 ):
-    # Analyze the answer first
-    video_analysis = await analyze_interview_video(
-        video=video,
-        question=previous_question,
-        company=company,
-        question_count=question_count,
+    started = time.perf_counter()
+    try:
+        contents = await prepare_upload_question(
+            file, company, job_description, current_user["username"]
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def finish(text):
+        return await start_interview(current_user["username"], company, text, contents)
+
+    return StreamingResponse(
+        stream_generation(model, contents, finish, stream_timings, "upload", started),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
     )
 
+
+def default_analysis(question_count: int) -> dict:
+    return {
+        "overall_assessment": "Unable to generate detailed analysis",
+        "strengths": [],
+        "weaknesses": [],
+        "technical_analysis": "Analysis not available",
+        "communication_analysis": "Analysis not available",
+        "recommendations": [],
+        "readiness_level": "Unknown",
+        "interview_duration": "Unknown",
+        "question_count": question_count,
+    }
+
+
+async def generate_detailed_analysis(prompt: str, question_count: int) -> dict:
+    """JSON analysis for the dashboard, or default values if it fails."""
+    try:
+        analysis_result = await asyncio.wait_for(
+            model.generate_content_async(prompt, cache="final-report"),
+            FINAL_REPORT_TIMEOUT,
+        )
+        # Try to find JSON in the response
+        json_match = re.search(r"```json\n(.*?)\n```", analysis_result.text, re.DOTALL)
+        if json_match:
+            return json.loads(json_match.group(1))
+        # If no JSON block found, try to parse the entire response
+        return json.loads(analysis_result.text)
+    except json.JSONDecodeError:
+        print("Failed to parse analysis JSON, using default values")
+    except asyncio.TimeoutError:
+        print("Detailed analysis timed out, using default values")
+    except Exception as e:
+        print(f"Detailed analysis failed, using default values: {str(e)}")
+    return default_analysis(question_count)
+
+
+async def generate_final_feedback(prompt: str) -> str:
+    """Markdown feedback for the candidate, or a short notice if it fails."""
+    try:
+        final_feedback = await asyncio.wait_for(
+            model.generate_content_async(prompt, cache="final-report"),
+            FINAL_REPORT_TIMEOUT,
+        )
+        return final_feedback.text.strip()
+    except asyncio.TimeoutError:
+        print("Final feedback timed out")
+    except Exception as e:
+        print(f"Final feedback failed: {str(e)}")
+    return FINAL_FEEDBACK_UNAVAILABLE
+
+
+async def get_answer_analysis(
+    video: Optional[UploadFile],
+    analysis_job_id: Optional[str],
+    upload_id: Optional[str],
+    session_id: Optional[str],
+    previous_question: str,
+    company: str,
+    question_count: int,
+    username: str,
+):
+    """The ``(scores, feedback, answer)`` for the answer being submitted."""
+    if upload_id:
+        # Uploaded while recording; its analysis started when it finished
+        return await answer_uploads.result(
+            upload_id, username, session_id, question_count
+        )
+    if analysis_job_id:
+        # The answer was already analyzed by a background job, which can
+        # only stand for this one turn
+        job = await analysis_jobs.take_result(
+            analysis_job_id,
+            username,
+            {"session_id": session_id, "turn": question_count},
+        )
+        result = job["result"]
+        return result["scores"], result["feedback"], result["answer"]
+    if video is not None:
+        # Analyze the answer first
+        return await analyze_interview_video(
+            video=video,
+            question=previous_question,
+            company=company,
+            question_count=question_count,
+        )
+    raise HTTPException(
+        status_code=400, detail="Send a video, an upload_id or an analysis_job_id"
+    )
+
+
+async def load_interview(
+    session_id: Optional[str],
+    previous_question: Optional[str],
+    company: Optional[str],
+    interview_history: Optional[str],
+    username: str,
+) -> dict:
+    """The session the submitted answer belongs to.
+
+    Older clients send the question, company and whole history instead of a
+    session id; that becomes a session that only lives for the request.
+    """
+    if session_id:
+        session = await interview_sessions.get(session_id, username)
+        if not session:
+            raise HTTPException(status_code=404, detail="Interview session not found")
+        if session["status"] != ACTIVE:
+            raise HTTPException(status_code=409, detail="The interview is finished")
+        return session
+    if previous_question is None or company is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Send a session_id, or previous_question and company",
+        )
+    history = json.loads(interview_history) if interview_history else []
+    return {
+        "_id": None,
+        "company": company,
+        "current_question": previous_question,
+        "turns": len(history),
+        "history": history,
+    }
+
+
+async def save_turn(
+    session: dict,
+    history: list,
+    next_question=None,
+    result=None,
+    folded=None,
+    upload_id=None,
+):
+    """Records the latest turn; returns what the client needs to go on.
+
+    The answer's upload, if it came as one, is kept until then, so a retry
+    of a submission that failed on the way can still use it.
+    """
+    if session["_id"] is None:
+        # Stateless request, the client keeps the history
+        answer_uploads.release(upload_id)
+        return {"interview_history": history}
+    if result is not None:
+        # The history is stored once already
+        result = {k: v for k, v in result.items() if k != "interview_history"}
+    await interview_sessions.record_turn(
+        session, history[-1], next_question=next_question, result=result, folded=folded
+    )
+    answer_uploads.release(upload_id)
+    return {"session_id": session["_id"], "question_count": len(history) + 1}
+
+
+def record_answer(history: list, previous_question: str, video_analysis):
+    """Appends the answer to the history; returns it and whether to go on."""
     # Add current Q&A to history
     current_qa = {
         "question": previous_question,
@@ -242,9 +645,7 @@ async def get_next_question(
         "scores": video_analysis[0],  # The scores
     }
 
-    # Parse existing history and append current Q&A
-    history = json.loads(interview_history) if interview_history else []
-    history.append(current_qa)
+    history = [*history, current_qa]
 
     # Calculate average score
     average_score = (
@@ -255,47 +656,81 @@ async def get_next_question(
         + video_analysis[0]["speaking_pace"]
     ) / 5
 
-    continue_interview = average_score >= 3
+    return history, average_score >= 3
 
-    if not continue_interview:
-        # Create a comprehensive summary of the entire interview
-        qa_summary = "\n".join(
-            [
-                f"""
-            Question {i+1}: {qa['question']}
-            Answer: {qa['answer']}
-            Feedback: {qa['feedback']}
-            Scores:
-            - Technical Accuracy: {qa['scores']['technical_accuracy']}
-            - Communication Clarity: {qa['scores']['communication_clarity']}
-            - Body Language: {qa['scores']['body_language']}
-            - Eye Contact: {qa['scores']['eye_contact']}
-            - Speaking Pace: {qa['scores']['speaking_pace']}
-            """
-                for i, qa in enumerate(history)
-            ]
-        )
-
-        # Calculate overall metrics
-        overall_metrics = {
-            "technical_accuracy": sum(
-                qa["scores"]["technical_accuracy"] for qa in history
-            )
-            / len(history),
-            "communication_clarity": sum(
-                qa["scores"]["communication_clarity"] for qa in history
-            )
-            / len(history),
-            "body_language": sum(qa["scores"]["body_language"] for qa in history)
-            / len(history),
-            "eye_contact": sum(qa["scores"]["eye_contact"] for qa in history)
-            / len(history),
-            "speaking_pace": sum(qa["scores"]["speaking_pace"] for qa in history)
-            / len(history),
-        }
 
-        # Generate detailed analysis prompt
-        analysis_prompt = f"""Based on the complete interview history:
+def prefetch_context(session: dict, folded: dict) -> list:
+    """The resume and the interview so far, for prefetching follow-ups."""
+    context = []
+    if session.get("resume_file"):
+        context += [file_part(session["resume_file"]), "\n\n"]
+    so_far = "\n".join(
+        filter(None, [folded["summary"], *folded["pending"], *folded["digest"]])
+    )
+    context.append(f"The interview so far:\n{so_far}\n\n")
+    return context
+
+
+# Summary updates running after their turn was answered
+summary_tasks = set()
+
+
+async def update_summary(session_id: str, turns: int, folded: dict):
+    rolled = await history_summarizer.roll(folded)
+    if rolled is not folded and not await interview_sessions.update_summary(
+        session_id, turns, rolled
+    ):
+        print(f"Session {session_id} moved on before its summary was stored")
+
+
+def roll_summary(session: dict, folded: dict):
+    """Folds old answers into the summary of the session, now at
+    ``folded``, in the background, once the turn has been recorded.
+    """
+    if session["_id"] is None:
+        # Nothing is kept between stateless requests
+        return
+    task = asyncio.create_task(
+        update_summary(session["_id"], session["turns"] + 1, folded)
+    )
+    summary_tasks.add(task)
+    task.add_done_callback(summary_tasks.discard)
+
+
+def final_report_prompts(folded: dict, history: list, company: str):
+    """Returns ``(analysis_prompt, final_prompt, overall_metrics)``.
+
+    Built from the session's condensed state (``fold_turn``): the running
+    statistics, the rolling summary, the condensed history and the last few
+    answers, kept within ``HISTORY_TOKEN_BUDGET`` however many questions were
+    asked.
+    """
+    question_count = len(history)
+    metrics = folded["metrics"]
+    statistics = score_statistics(metrics)
+    score_lines = "\n".join(
+        f"- {dimension.replace('_', ' ').title()}: mean {stats['mean']}, "
+        f"min {stats['min']}, max {stats['max']}, variance {stats['variance']}"
+        for dimension, stats in statistics.items()
+    )
+    answers = compact_history(history, folded)
+    tokens_before = folded["history_tokens"]
+    tokens_after = estimate_tokens(answers)
+    prompt_sizes.record(tokens_before, tokens_after)
+    print(
+        f"Final report history: ~{tokens_before} tokens in full, "
+        f"~{tokens_after} sent"
+    )
+    qa_summary = (
+        f"Scores over all {question_count} answers (1-5):\n{score_lines}\n\n"
+        f"{answers}"
+    )
+
+    # Overall metrics for the dashboard
+    overall_metrics = average_scores(metrics)
+
+    # Generate detailed analysis prompt
+    analysis_prompt = f"""Based on the complete interview history:
 
         {qa_summary}
 
@@ -309,39 +744,13 @@ async def get_next_question(
             "recommendations": ["Specific actionable recommendations for improvement"],
             "readiness_level": "Assessment of readiness for the role (e.g., 'Ready', 'Needs Improvement', 'Not Ready')",
             "interview_duration": "Estimated duration of the interview",
-            "question_count": {len(history)}
+            "question_count": {question_count}
         }}
 
         Make the analysis constructive and actionable. Return ONLY the JSON object, no additional text or formatting."""
 
-        # Generate detailed analysis
-        analysis_result = model.generate_content(analysis_prompt)
-        try:
-            # Try to find JSON in the response
-            json_match = re.search(
-                r"```json\n(.*?)\n```", analysis_result.text, re.DOTALL
-            )
-            if json_match:
-                analysis_data = json.loads(json_match.group(1))
-            else:
-                # If no JSON block found, try to parse the entire response
-                analysis_data = json.loads(analysis_result.text)
-        except json.JSONDecodeError:
-            print("Failed to parse analysis JSON, using default values")
-            analysis_data = {
-                "overall_assessment": "Unable to generate detailed analysis",
-                "strengths": [],
-                "weaknesses": [],
-                "technical_analysis": "Analysis not available",
-                "communication_analysis": "Analysis not available",
-                "recommendations": [],
-                "readiness_level": "Unknown",
-                "interview_duration": "Unknown",
-                "question_count": len(history),
-            }
-
-        # Generate final feedback
-        final_prompt = f"""Based on the complete interview history:
+    # Generate final feedback
+    final_prompt = f"""Based on the complete interview history:
 
         {qa_summary}
 
@@ -357,30 +766,42 @@ async def get_next_question(
         
         Make it constructive and actionable."""
 
-        final_feedback = model.generate_content(final_prompt)
+    return analysis_prompt, final_prompt, overall_metrics
 
-        return {
-            "done": True,
-            "analysis": str(video_analysis),
-            "final_feedback": final_feedback.text.strip(),
-            "interview_history": history,
-            "dashboard_data": {
-                "overall_metrics": overall_metrics,
-                "detailed_analysis": {
-                    **analysis_data,
-                    "final_feedback": final_feedback.text.strip(),
-                },
-                "interview_summary": {
-                    "total_questions": len(history),
-                    "average_scores": overall_metrics,
-                    "company": company,
-                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                },
+
+def final_report_response(
+    video_analysis,
+    history,
+    company,
+    metrics,
+    overall_metrics,
+    analysis_data,
+    final_feedback,
+) -> dict:
+    return {
+        "done": True,
+        "analysis": str(video_analysis),
+        "final_feedback": final_feedback,
+        "interview_history": history,
+        "dashboard_data": {
+            "overall_metrics": overall_metrics,
+            "score_statistics": score_statistics(metrics),
+            "detailed_analysis": {
+                **analysis_data,
+                "final_feedback": final_feedback,
             },
-        }
+            "interview_summary": {
+                "total_questions": len(history),
+                "average_scores": overall_metrics,
+                "company": company,
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            },
+        },
+    }
+
 
-    # Generate next question if continuing
-    next_question_prompt = f"""Based on the previous question: '{previous_question}'
+def next_question_prompt(previous_question: str, video_analysis) -> str:
+    return f"""Based on the previous question: '{previous_question}'
     
     The answer was rated as follows:
     {video_analysis}
@@ -392,16 +813,250 @@ async def get_next_question(
     
     Return ONLY the question as a string."""
 
-    result = model.generate_content(next_question_prompt)
 
+@app.post("/next-question")
+async def get_next_question(
+    video: Optional[UploadFile] = File(None),
+    session_id: Optional[str] = Form(None),
+    analysis_job_id: Optional[str] = Form(None),
+    upload_id: Optional[str] = Form(None),
+    previous_question: Optional[str] = Form(None),
+    company: Optional[str] = Form(None),
+    interview_history: Optional[str] = Form(None),
+    current_user: dict = Depends(get_current_user),
+):
+    session = await load_interview(
+        session_id,
+        previous_question,
+        company,
+        interview_history,
+        current_user["username"],
+    )
+    previous_question, company = session["current_question"], session["company"]
+    video_analysis = await get_answer_analysis(
+        video,
+        analysis_job_id,
+        upload_id,
+        session["_id"],
+        previous_question,
+        company,
+        session["turns"] + 1,
+        current_user["username"],
+    )
+    history, continue_interview = record_answer(
+        session["history"], previous_question, video_analysis
+    )
+    folded = fold_turn(session, history[-1])
+
+    if not continue_interview:
+        # No follow-up is needed for the last question
+        question_prefetcher.discard(current_user["username"], previous_question)
+        # Normally already done as the interview went
+        folded = await history_summarizer.roll(folded)
+        analysis_prompt, final_prompt, overall_metrics = final_report_prompts(
+            folded, history, company
+        )
+
+        # Both reports take the same input, so generate them concurrently
+        analysis_data, final_feedback = await asyncio.gather(
+            generate_detailed_analysis(analysis_prompt, len(history)),
+            generate_final_feedback(final_prompt),
+        )
+
+        response = final_report_response(
+            video_analysis,
+            history,
+            company,
+            folded["metrics"],
+            overall_metrics,
+            analysis_data,
+            final_feedback,
+        )
+        return {
+            **response,
+            **await save_turn(
+                session,
+                history,
+                result=response,
+                folded=folded,
+                upload_id=upload_id,
+            ),
+        }
+
+    # Use a follow-up prepared while the candidate was answering, if any
+    next_question = await question_prefetcher.take(
+        current_user["username"], previous_question, video_analysis[0]
+    )
+    if next_question is None:
+        # Generate next question if continuing
+        generation_started = time.perf_counter()
+        result = await model.generate_content_async(
+            next_question_prompt(previous_question, video_analysis),
+            cache="next-question",
+        )
+        question_prefetcher.record_fresh(time.perf_counter() - generation_started)
+        next_question = result.text.strip()
+
+    question_prefetcher.prefetch(
+        current_user["username"],
+        next_question,
+        company,
+        context=prefetch_context(session, folded),
+    )
+    saved = await save_turn(
+        session,
+        history,
+        next_question=next_question,
+        folded=folded,
+        upload_id=upload_id,
+    )
+    # The summary is updated once the turn is answered
+    roll_summary(session, folded)
     return {
         "done": False,
-        "next_question": result.text.strip(),
+        "next_question": next_question,
         "analysis": video_analysis,
-        "interview_history": history,
+        **saved,
     }
 
 
+@app.post("/next-question/stream")
+async def get_next_question_stream(
+    video: Optional[UploadFile] = File(None),
+    session_id: Optional[str] = Form(None),
+    analysis_job_id: Optional[str] = Form(None),
+    upload_id: Optional[str] = Form(None),
+    previous_question: Optional[str] = Form(None),
+    company: Optional[str] = Form(None),
+    interview_history: Optional[str] = Form(None),
+    current_user: dict = Depends(get_current_user),
+):
+    """Like /next-question, but streams the next question or final feedback."""
+    started = time.perf_counter()
+    session = await load_interview(
+        session_id,
+        previous_question,
+        company,
+        interview_history,
+        current_user["username"],
+    )
+    previous_question, company = session["current_question"], session["company"]
+    video_analysis = await get_answer_analysis(
+        video,
+        analysis_job_id,
+        upload_id,
+        session["_id"],
+        previous_question,
+        company,
+        session["turns"] + 1,
+        current_user["username"],
+    )
+    history, continue_interview = record_answer(
+        session["history"], previous_question, video_analysis
+    )
+    folded = fold_turn(session, history[-1])
+
+    if not continue_interview:
+        # No follow-up is needed for the last question
+        question_prefetcher.discard(current_user["username"], previous_question)
+        # Normally already done as the interview went
+        folded = await history_summarizer.roll(folded)
+        analysis_prompt, final_prompt, overall_metrics = final_report_prompts(
+            folded, history, company
+        )
+        # The JSON analysis is generated while the feedback streams
+        analysis_task = asyncio.ensure_future(
+            generate_detailed_analysis(analysis_prompt, len(history))
+        )
+
+        async def finish_report(final_feedback):
+            response = final_report_response(
+                video_analysis,
+                history,
+                company,
+                folded["metrics"],
+                overall_metrics,
+                await analysis_task,
+                final_feedback,
+            )
+            return {
+                **response,
+                **await save_turn(
+                    session,
+                    history,
+                    result=response,
+                    folded=folded,
+                    upload_id=upload_id,
+                ),
+            }
+
+        events = stream_generation(
+            model,
+            final_prompt,
+            finish_report,
+            stream_timings,
+            "final-feedback",
+            started,
+            fallback=FINAL_FEEDBACK_UNAVAILABLE,
+        )
+    else:
+        prefetched = await question_prefetcher.take(
+            current_user["username"], previous_question, video_analysis[0]
+        )
+
+        async def finish_question(next_question):
+            question_prefetcher.prefetch(
+                current_user["username"],
+                next_question,
+                company,
+                context=prefetch_context(session, folded),
+            )
+            saved = await save_turn(
+                session,
+                history,
+                next_question=next_question,
+                folded=folded,
+                upload_id=upload_id,
+            )
+            # The summary is updated once the turn is answered
+            roll_summary(session, folded)
+            return {
+                "done": False,
+                "next_question": next_question,
+                "analysis": video_analysis,
+                **saved,
+            }
+
+        if prefetched is not None:
+            events = stream_text(
+                prefetched, finish_question, stream_timings, "next-question", started
+            )
+        else:
+            events = stream_generation(
+                model,
+                next_question_prompt(previous_question, video_analysis),
+                finish_question,
+                stream_timings,
+                "next-question",
+                started,
+            )
+
+    return StreamingResponse(
+        events, media_type="text/event-stream", headers=SSE_HEADERS
+    )
+
+
+@app.get("/interview-sessions/{session_id}")
+async def get_interview_session(
+    session_id: str, current_user: dict = Depends(get_current_user)
+):
+    """Where an interview stands, e.g. to pick it up again after a reconnect."""
+    session = await interview_sessions.get(session_id, current_user["username"])
+    if not session:
+        raise HTTPException(status_code=404, detail="Interview session not found")
+    return public_session(session)
+
+
 @app.post("/upload-user-resume")
 async def upload_user_resume(
     file: UploadFile = File(...), current_user: dict = Depends(get_current_user)
@@ -413,34 +1068,36 @@ async def upload_user_resume(
         filename = f"{current_user['username']}_{timestamp}_{file.filename}"
         file_location = f"resumes/{filename}"
 
-        with open(file_location, "wb+") as file_object:
-            file_object.write(await file.read())
+        _, sha256 = await save_upload(file, file_location, MAX_RESUME_BYTES)
 
         # Store resume information in the database
         resume_info = {
             "filename": file.filename,
             "upload_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "file_path": file_location,
+            "sha256": sha256,
         }
 
-        # Update user's resumes in database (create array if it doesn't exist)
-        users_collection.update_one(
-            {"username": current_user["username"]}, {"$push": {"resumes": resume_info}}
-        )
+        await resume_store.add(current_user["username"], resume_info)
 
         return {"detail": "Resume uploaded successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/user-resumes")
-async def get_user_resumes(current_user: dict = Depends(get_current_user)):
+async def get_user_resumes(
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    current_user: dict = Depends(get_current_user),
+):
     try:
-        user = users_collection.find_one(
-            {"username": current_user["username"]}, {"resumes": 1}
+        total, resumes = await resume_store.list(
+            current_user["username"], limit, offset
         )
-        if user:
-            return {"resumes": user.get("resumes", [])}
+        return {"resumes": resumes, "total": total, "limit": limit, "offset": offset}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -448,54 +1105,29 @@ async def get_user_resumes(current_user: dict = Depends(get_current_user)):
 @app.delete("/delete-resume/{filename}")
 async def delete_resume(filename: str, current_user: dict = Depends(get_current_user)):
     try:
-        # Find the resume in the user's resumes
-        user = users_collection.find_one({"username": current_user["username"]})
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        resumes = user.get("resumes", [])
-
-        resume_to_delete = next((r for r in resumes if r["filename"] == filename), None)
-
-        if not resume_to_delete:
+        # Delete the files and their database entries
+        if not await resume_store.delete(current_user["username"], filename):
             raise HTTPException(status_code=404, detail="Resume not found")
 
-        # Delete file from filesystem
-        if os.path.exists(resume_to_delete["file_path"]):
-            os.remove(resume_to_delete["file_path"])
-
-        # Remove resume from database
-        users_collection.update_one(
-            {"username": current_user["username"]},
-            {"$pull": {"resumes": {"filename": filename}}},
-        )
-
         return {"detail": "Resume deleted successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/use-existing-resume")
-async def use_existing_resume(
-    request: dict, current_user: dict = Depends(get_current_user)
-):
-    try:
-        # Find the resume in user's resumes
-        user = users_collection.find_one({"username": current_user["username"]})
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        resumes = user.get("resumes", [])
-        resume_info = next(
-            (r for r in resumes if r["filename"] == request["filename"]), None
-        )
+async def prepare_existing_resume_question(request: dict, username: str) -> list:
+    """Returns the contents for the opening question from a stored resume."""
+    resume_info = await resume_store.get(username, request["filename"])
 
-        if not resume_info:
-            raise HTTPException(status_code=404, detail="Resume not found")
+    if not resume_info:
+        raise HTTPException(status_code=404, detail="Resume not found")
 
-        # Upload file to Gemini
-        resume_file = genai.upload_file(Path(resume_info["file_path"]))
+    # Upload file to Gemini (or reuse a live upload of the same file)
+    resume_file = await resume_cache.get_file(username, resume_info)
 
-        # Generate prompt for single question
-        prompt = f"""Based on this resume and the following job description:
+    # Generate prompt for single question
+    prompt = f"""Based on this resume and the following job description:
         {request["job_description"]}
         
         Generate ONE technical interview question that might be asked at {request["company"]} for this specific role.
@@ -503,14 +1135,59 @@ async def use_existing_resume(
         Ask the question based on the resume.
         Return ONLY the question as a string, no additional text or formatting."""
 
+    return [resume_file, "\n\n", prompt]
+
+
+@app.post("/use-existing-resume")
+async def use_existing_resume(
+    request: dict, current_user: dict = Depends(get_current_user)
+):
+    try:
+        contents = await prepare_existing_resume_question(
+            request, current_user["username"]
+        )
+
         # Generate response using Gemini
-        result = model.generate_content([resume_file, "\n\n", prompt])
+        result = await model.generate_content_async(
+            contents, cache="use-existing-resume"
+        )
+        question = result.text.strip()
 
-        return {"question": result.text.strip()}
+        return await start_interview(
+            current_user["username"], request["company"], question, contents
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/use-existing-resume/stream")
+async def use_existing_resume_stream(
+    request: dict, current_user: dict = Depends(get_current_user)
+):
+    started = time.perf_counter()
+    try:
+        contents = await prepare_existing_resume_question(
+            request, current_user["username"]
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def finish(text):
+        return await start_interview(
+            current_user["username"], request["company"], text, contents
+        )
+
+    return StreamingResponse(
+        stream_generation(
+            model, contents, finish, stream_timings, "use-existing-resume", started
+        ),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
 @app.get("/view-resume/{filename}")
 async def view_resume(
     filename: str,
@@ -518,16 +1195,11 @@ async def view_resume(
 ):
     try:
         # Verify token and get user
-        current_user = verify_token(token)
+        current_user = await verify_token(token)
         if not current_user:
             raise HTTPException(status_code=401, detail="Invalid token")
 
-        # Find the resume in user's resumes
-        user = users_collection.find_one({"username": current_user["username"]})
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        resumes = user.get("resumes", [])
-        resume_info = next((r for r in resumes if r["filename"] == filename), None)
+        resume_info = await resume_store.get(current_user["username"], filename)
 
         if not resume_info:
             raise HTTPException(status_code=404, detail="Resume not found")
@@ -550,13 +1222,13 @@ async def view_resume(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def verify_token(token: str):
+async def verify_token(token: str):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username = payload.get("sub")
         if username is None:
             return None
-        user = users_collection.find_one({"username": username})
+        user = await user_cache.get(username)
         return user
     except Exception as e:
         print(e)
@@ -564,45 +1236,78 @@ def verify_token(token: str):
 
 
 # Video analysis function
-def upload_to_gemini(path, mime_type=None):
+async def upload_to_gemini(path, mime_type=None):
     """Uploads the given file to Gemini."""
-    file = genai.upload_file(path, mime_type=mime_type)
+    file = await run_blocking(genai.upload_file, path, mime_type=mime_type)
     print(f"Uploaded file '{file.display_name}' as: {file.uri}")
     return file
 
 
-def wait_for_files_active(files):
+async def wait_for_files_active(files):
     """Waits for the given files to be active."""
     print("Waiting for file processing...")
-    for name in (file.name for file in files):
-        file = genai.get_file(name)
-        while file.state.name == "PROCESSING":
-            print(".", end="", flush=True)
-            time.sleep(10)
-            file = genai.get_file(name)
-        if file.state.name != "ACTIVE":
-            raise Exception(f"File {file.name} failed to process")
+    await file_waiter.wait_for_active([file.name for file in files])
     print("...all files ready")
-    print()
 
 
-def analyze_video(video_path: str) -> tuple[dict, str, str]:
-    scores = {
-        "technical_accuracy": 0,
-        "communication_clarity": 0,
-        "body_language": 0,
-        "eye_contact": 0,
-        "speaking_pace": 0,
-    }
+VIDEO_SCORES = (
+    "technical_accuracy",
+    "communication_clarity",
+    "body_language",
+    "eye_contact",
+    "speaking_pace",
+)
+
+
+def video_analysis_prompt(dimensions) -> str:
+    scores = ",\n".join(f'                        "{d}": 0' for d in dimensions)
+    return f"""
+                You are an interviewer. Analyze the video and provide feedback, and provide detailed analysis. 
+                Answer is what is the candidate saying.
+                The feedback should be in the following format:
+                ```json
+                {{
+                    "scores": {{
+{scores}
+                    }},
+                    "feedback": "",
+                    "answer": ""
+                }}
+                ```
+                if some of the scores are not applicable, set them to 0.
+                """
+
+
+def parse_json_reply(text: str):
+    """The JSON object in a model reply, with or without a code fence."""
+    match = re.search(r"```json\n(.*?)\n```", text, re.DOTALL) or re.search(
+        r"\{.*\}", text, re.DOTALL
+    )
+    if not match:
+        print("No JSON response found")
+        return None
+    try:
+        return json.loads(match.group(1) if match.re.groups else match.group(0))
+    except json.JSONDecodeError:
+        print("Failed to parse JSON response")
+        return None
+
+
+async def visual_analysis(video_path: str, skip=()):
+    """``(scores, feedback, answer)`` from the video model, which isn't asked
+    for the score dimensions in ``skip``.
+    """
+    dimensions = [d for d in VIDEO_SCORES if d not in skip]
+    scores = {d: 0 for d in dimensions}
 
     feedback = ""
     answer = ""
 
     # Upload video to Gemini
-    video_file = upload_to_gemini(video_path, mime_type="video/mp4")
+    video_file = await upload_to_gemini(video_path, mime_type="video/mp4")
 
     # Wait for the video file to be processed
-    wait_for_files_active([video_file])
+    await wait_for_files_active([video_file])
 
     # Create the model for analysis
     generation_config = {
@@ -618,45 +1323,88 @@ def analyze_video(video_path: str) -> tuple[dict, str, str]:
         generation_config=generation_config,
     )
 
-    prompt = """
-                You are an interviewer. Analyze the video and provide feedback, and provide detailed analysis. 
-                Answer is what is the candidate saying.
-                The feedback should be in the following format:
-                ```json
-                {
-                    "scores": {
-                        "technical_accuracy": 0,
-                        "communication_clarity": 0,
-                        "body_language": 0,
-                        "eye_contact": 0,
-                        "speaking_pace": 0
-                    },
-                    "feedback": "",
-                    "answer": ""
-                }
-                ```
-                if some of the scores are not applicable, set them to 0.
-                """
-
     chat_session = model.start_chat(history=[])
 
-    json_response = chat_session.send_message([prompt, video_file]).text
+    json_response = (
+        await chat_session.send_message_async(
+            [video_analysis_prompt(dimensions), video_file]
+        )
+    ).text
 
-    response = re.search(r"```json\n(.*?)\n```", json_response, re.DOTALL)
-    if response:
-        try:
-            response_dict = json.loads(response.group(1))
-            scores = response_dict.get("scores", scores)
-            feedback = response_dict.get("feedback", "")
-            answer = response_dict.get("answer", "")
-        except json.JSONDecodeError:
-            print("Failed to parse JSON response")
-    else:
-        print("No JSON response found")
+    response_dict = parse_json_reply(json_response)
+    if response_dict is not None:
+        scores = response_dict.get("scores", scores)
+        feedback = response_dict.get("feedback", "")
+        answer = response_dict.get("answer", "")
 
     return scores, feedback, answer
 
 
+def technical_grading_prompt(question: Optional[str], transcript: str) -> str:
+    asked = f"The question was: '{question}'\n" if question else ""
+    return f"""You are a technical interviewer. {asked}The candidate answered (transcribed from speech, so expect small recognition errors):
+    '{transcript}'
+
+    Rate the technical accuracy of the answer from 1 to 5 and explain the rating briefly.
+    Return ONLY a JSON object: {{"technical_accuracy": 0, "feedback": ""}}"""
+
+
+async def transcript_analysis(audio_path: Optional[str], question: Optional[str]):
+    """The local transcript and the text model's grade of it, or None."""
+    if audio_path is None:
+        return None
+    transcript = await transcriber.transcribe(audio_path)
+    if not transcript:
+        return None
+    grade = parse_json_reply(
+        await generate_text(
+            technical_grading_prompt(question, transcript), cache="grading"
+        )
+    )
+    if not isinstance(grade, dict):
+        grade = {}
+    return {
+        "answer": transcript,
+        "technical_accuracy": grade.get("technical_accuracy"),
+        "feedback": grade.get("feedback", ""),
+    }
+
+
+async def analyze_video(
+    video_path: str, question: Optional[str] = None
+) -> tuple[dict, str, str]:
+    async with scratch.temp_file(suffix=".mp4") as small_path, scratch.temp_file(
+        suffix=".wav"
+    ) as audio_path:
+        # A downscaled copy is uploaded to Gemini; the audio for local speech
+        # recognition comes out of the same pass
+        upload_path = await video_preprocessor.prepare(
+            video_path, small_path, audio_path if transcriber.enabled else None
+        )
+        scratch.track(small_path)
+        transcribing = transcriber.enabled and os.path.exists(audio_path)
+        if transcribing:
+            scratch.track(audio_path)
+
+        # The answer is transcribed and graded, and the frames analyzed,
+        # while the video model looks at the video. The model still gives
+        # its own reading of the answer, in case the transcription fails.
+        # What local vision replaces isn't asked of it.
+        (scores, feedback, answer), spoken, seen = await asyncio.gather(
+            visual_analysis(upload_path, local_vision.replaced),
+            transcript_analysis(audio_path if transcribing else None, question),
+            local_vision.analyze(upload_path),
+        )
+    scores = local_vision.merge(scores, seen)
+    if spoken is None:
+        return scores, feedback, answer
+    if isinstance(spoken["technical_accuracy"], (int, float)):
+        scores = {**scores, "technical_accuracy": spoken["technical_accuracy"]}
+    if spoken["feedback"]:
+        feedback = f"{feedback}\n\nTechnical accuracy: {spoken['feedback']}"
+    return scores, feedback, spoken["answer"]
+
+
 @app.post("/analyze-video")
 async def analyze_interview_video(
     video: UploadFile = File(...),
@@ -664,55 +1412,170 @@ async def analyze_interview_video(
     company: str = Form(...),
     question_count: int = Form(...),
 ) -> tuple[Dict[str, int], str, str]:
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_video:
-        content = await video.read()
-        temp_video.write(content)
-        temp_video.flush()
+    # The video is deleted as soon as the analysis is done
+    async with scratch.temp_file(suffix=".mp4") as video_path:
+        await save_upload(
+            video,
+            video_path,
+            MAX_VIDEO_BYTES,
+            reserve=lambda nbytes: scratch.reserve(video_path, nbytes),
+        )
+        scratch.track(video_path)
 
-        scores, feedback, answer = analyze_video(temp_video.name)
-        # Remove the temporary file
-        # os.unlink(temp_video.name)
+        scores, feedback, answer = await analyze_video(video_path, question)
 
     return scores, feedback, answer
 
 
+@app.post("/analysis-jobs")
+async def submit_analysis_job(
+    video: UploadFile = File(...),
+    question: str = Form(...),
+    company: str = Form(...),
+    question_count: int = Form(...),
+    current_user: dict = Depends(get_current_user),
+):
+    job = await analysis_jobs.submit(
+        current_user["username"],
+        video,
+        {"question": question, "company": company, "question_count": question_count},
+    )
+    return {"job_id": job["_id"], "status": job["status"]}
+
+
+@app.get("/analysis-jobs/{job_id}")
+async def get_analysis_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    job = await analysis_jobs.get(job_id, current_user["username"])
+    if not job:
+        raise HTTPException(status_code=404, detail="Analysis job not found")
+    return public_job(job)
+
+
+@app.get("/analysis-jobs/{job_id}/events")
+async def stream_analysis_job(job_id: str, token: str = Query(...)):
+    # EventSource can't send headers, so the token comes in the query string
+    current_user = await verify_token(token)
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    username = current_user["username"]
+    if not await analysis_jobs.get(job_id, username):
+        raise HTTPException(status_code=404, detail="Analysis job not found")
+
+    async def events():
+        last_update = None
+        while True:
+            job = await analysis_jobs.get(job_id, username)
+            if job is None:
+                return
+            if job["updated_at"] != last_update:
+                last_update = job["updated_at"]
+                yield sse_event("status", public_job(job))
+            if job["status"] in TERMINAL_STATES:
+                return
+            await asyncio.sleep(JOB_EVENTS_INTERVAL)
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers=SSE_HEADERS
+    )
+
+
+@app.post("/answer-uploads")
+async def create_answer_upload(
+    session_id: Optional[str] = Form(None),
+    current_user: dict = Depends(get_current_user),
+):
+    question = None
+    if session_id:
+        session = await interview_sessions.get(session_id, current_user["username"])
+        if not session:
+            raise HTTPException(status_code=404, detail="Interview session not found")
+        question = session["current_question"]
+    upload = answer_uploads.create(current_user["username"], session_id, question)
+    return public_upload(upload)
+
+
+@app.get("/answer-uploads/{upload_id}")
+async def get_answer_upload(
+    upload_id: str, current_user: dict = Depends(get_current_user)
+):
+    return answer_uploads.status(upload_id, current_user["username"])
+
+
+@app.put("/answer-uploads/{upload_id}")
+async def append_answer_upload(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    current_user: dict = Depends(get_current_user),
+):
+    # The piece is the raw request body, streamed straight to the file
+    received = await answer_uploads.append(
+        upload_id, current_user["username"], offset, request.stream()
+    )
+    return {"upload_id": upload_id, "received": received}
+
+
+@app.post("/answer-uploads/{upload_id}/finish")
+async def finish_answer_upload(
+    upload_id: str, current_user: dict = Depends(get_current_user)
+):
+    return await answer_uploads.finish(upload_id, current_user["username"])
+
+
 @app.get("/companies")
-async def get_companies():
+async def get_companies(request: Request):
     try:
-        # Read the CSV file with proper quoting
-        df = pd.read_excel("data.xlsx")
-        # Get unique companies and sort them
-        companies = sorted(df["company"].unique().tolist())
-        return {"companies": companies}
+        index = await company_index.get()
+        headers = {
+            "ETag": f'"{company_index.etag}"',
+            "Cache-Control": "public, max-age=60, must-revalidate",
+        }
+        # Let the browser reuse its copy if the dataset hasn't changed
+        if request.headers.get("if-none-match") == headers["ETag"]:
+            return Response(status_code=304, headers=headers)
+        return Response(
+            content=index.body, media_type="application/json", headers=headers
+        )
     except Exception as e:
         print(f"Error reading CSV: {str(e)}")  # Add logging for debugging
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/generate-questions-from-data")
-async def generate_questions_from_data(
-    request,
-):  # -> dict[str, Any | list[str] | list[Any]]:# -> dict[str, Any | list[str] | list[Any]]:# -> dict[str, Any | list[str] | list[Any]]:
+@app.get("/companies/search")
+async def search_companies(
+    q: str = Query(""),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+):
     try:
-        # Read the CSV file
-        df = pd.read_csv("data.csv")
+        index = await company_index.get()
+        total, companies = index.search(q, limit=limit, offset=offset)
+        return {
+            "query": q,
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "companies": companies,
+        }
+    except Exception as e:
+        print(f"Error searching companies: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # Filter questions for the specific company
-        company_data = df[df["company"].str.lower() == request.company.lower()]
 
-        if company_data.empty:
+@app.post("/generate-questions-from-data")
+async def generate_questions_from_data(request: QuestionRequest):
+    try:
+        # Sample questions for the company from the question bank
+        questions = await question_bank.sample(
+            request.company, request.num_questions, seed=request.seed
+        )
+
+        if not questions:
             raise HTTPException(
                 status_code=404,
                 detail=f"No questions found for company: {request.company}",
             )
 
-        # Get all questions for the company
-        questions = company_data["questions"].tolist()
-
-        # If we have more questions than requested, randomly sample
-        if len(questions) > request.num_questions:
-            questions = random.sample(questions, request.num_questions)
-
         # Generate prompt for Gemini to analyze and enhance the questions
         prompt = f"""Based on these existing questions for {request.company}:
         {json.dumps(questions)}
@@ -721,7 +1584,7 @@ async def generate_questions_from_data(
         Return the enhanced questions as a JSON array of strings.
         Keep the same number of questions as provided."""
 
-        result = model.generate_content(prompt)
+        result = await model.generate_content_async(prompt, cache="generate-questions")
 
         try:
             # Try to find JSON in the response
@@ -743,5 +1606,29 @@ async def generate_questions_from_data(
 
         return {"questions": enhanced_questions}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/metrics")
+async def get_metrics():
+    return {
+        "file_activation": file_waiter.stats(),
+        "resume_upload_cache": resume_cache.stats(),
+        "scratch": scratch.stats(),
+        "video_preprocessing": video_preprocessor.stats(),
+        "transcription": transcriber.stats(),
+        "local_vision": local_vision.stats(),
+        "analysis_jobs": analysis_jobs.stats(),
+        "answer_uploads": answer_uploads.stats(),
+        "streaming": stream_timings.stats(),
+        "question_prefetch": question_prefetcher.stats(),
+        "user_cache": user_cache.stats(),
+        "interview_sessions": interview_sessions.stats(),
+        "llm_cache": llm_cache.stats(),
+        "prompt_compaction": prompt_sizes.stats(),
+        "history_summary": history_summarizer.stats(),
+        "login_rate_limit": login_limiter.stats(),
+    }
@@ -0,0 +1,101 @@
+"""Password hashing on a dedicated process pool.
+
+bcrypt is deliberately slow: one hash or check takes a few hundred
+milliseconds of CPU and holds the GIL for all of it, so neither the event loop
+nor the shared thread pool can run it without stalling every other request. It
+runs in worker processes instead (``PASSWORD_POOL_SIZE``, a quarter of the CPU
+budget by default). Those cores are reserved for logins: the other process
+pools share the rest of the budget (see ``executor``), so a login never waits
+behind a video encode.
+
+Hashes are standard ``$2b$`` bcrypt strings, the same format passlib wrote
+before, so existing users can still log in.
+"""
+
+import os
+import time
+from collections import deque
+
+import bcrypt
+from fastapi import HTTPException
+
+from executor import CPU_BUDGET, ProcessPool
+
+PASSWORD_POOL_SIZE = int(os.getenv("PASSWORD_POOL_SIZE", str(max(1, CPU_BUDGET // 4))))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# bcrypt only looks at the first 72 bytes; passlib truncated silently too
+MAX_PASSWORD_BYTES = 72
+
+password_pool = ProcessPool(PASSWORD_POOL_SIZE, reserved=True)
+
+
+def _encode(password: str) -> bytes:
+    return password.encode("utf-8")[:MAX_PASSWORD_BYTES]
+
+
+def hash_password_sync(password: str) -> str:
+    return bcrypt.hashpw(_encode(password), bcrypt.gensalt(BCRYPT_ROUNDS)).decode()
+
+
+def verify_password_sync(password: str, hashed: str) -> bool:
+    try:
+        return bcrypt.checkpw(_encode(password), hashed.encode())
+    except (ValueError, AttributeError):
+        # Not a bcrypt hash
+        return False
+
+
+async def hash_password(password: str) -> str:
+    return await password_pool.run(hash_password_sync, password)
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await password_pool.run(verify_password_sync, password, hashed)
+
+
+class LoginRateLimiter:
+    """Allows at most ``max_attempts`` logins per username per ``window``.
+
+    Keeps a burst of guesses against one account from tying up the password
+    pool. ``max_attempts=0`` turns it off.
+    """
+
+    def __init__(self, max_attempts: int = 0, window: float = 60.0):
+        self.max_attempts = max_attempts
+        self.window = window
+        self._attempts = {}
+        self.rejected = 0
+
+    def check(self, username: str):
+        """Records an attempt; raises HTTPException 429 if over the limit."""
+        if not self.max_attempts:
+            return
+        now = time.monotonic()
+        attempts = self._attempts.setdefault(username, deque())
+        while attempts and now - attempts[0] >= self.window:
+            attempts.popleft()
+        if len(attempts) >= self.max_attempts:
+            self.rejected += 1
+            retry_after = int(self.window - (now - attempts[0])) + 1
+            raise HTTPException(
+                status_code=429,
+                detail="Too many login attempts, try again later",
+                headers={"Retry-After": str(retry_after)},
+            )
+        attempts.append(now)
+        if len(self._attempts) > 10000:
+            self._prune(now)
+
+    def _prune(self, now: float):
+        for username in list(self._attempts):
+            attempts = self._attempts[username]
+            if not attempts or now - attempts[-1] >= self.window:
+                del self._attempts[username]
+
+    def stats(self) -> dict:
+        return {
+            "max_attempts": self.max_attempts,
+            "window": self.window,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,100 @@
+"""Content-addressed cache of resume uploads to Gemini.
+
+Gemini keeps uploaded files for a while (48 hours at the time of writing), so
+a resume that was already uploaded does not need to be sent again. Resume
+documents carry the SHA-256 of the file, and once uploaded a ``gemini_file``
+sub-document with the remote name, URI and expiry. Every resume of the user
+with the same hash shares the handle, so uploading the same PDF twice still
+hits the cache.
+"""
+
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+import google.generativeai as genai
+
+from executor import run_blocking
+
+# Don't hand out a handle that could expire before the interview is over.
+EXPIRY_MARGIN = timedelta(hours=1)
+
+
+def sha256_file(path, chunk_size=1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_part(handle: dict):
+    """A content part for the uploaded file; ``handle`` has its URI and MIME type."""
+    return genai.protos.Part(
+        file_data=genai.protos.FileData(
+            file_uri=handle["uri"], mime_type=handle["mime_type"]
+        )
+    )
+
+
+class ResumeUploadCache:
+    def __init__(self, resumes_collection):
+        self.resumes_collection = resumes_collection
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    async def get_file(self, username: str, resume_info: dict):
+        """Returns something ``generate_content`` accepts for the resume."""
+        now = datetime.utcnow()
+        sha256 = resume_info.get("sha256")
+        if not sha256:
+            # Resume stored before hashes were recorded
+            sha256 = await run_blocking(sha256_file, resume_info["file_path"])
+            await self.resumes_collection.update_one(
+                {"file_path": resume_info["file_path"]}, {"$set": {"sha256": sha256}}
+            )
+
+        cached = await self.resumes_collection.find_one(
+            {
+                "username": username,
+                "sha256": sha256,
+                "gemini_file.expires_at": {"$gt": now + EXPIRY_MARGIN},
+            },
+            {"gemini_file": 1},
+        )
+        if cached:
+            self.hits += 1
+            return file_part(cached["gemini_file"])
+
+        if resume_info.get("gemini_file"):
+            self.expired += 1
+        self.misses += 1
+
+        uploaded = await run_blocking(genai.upload_file, resume_info["file_path"])
+        expires_at = uploaded.expiration_time
+        if expires_at is None:
+            expires_at = now + timedelta(hours=48)
+        elif expires_at.tzinfo is not None:
+            expires_at = expires_at.astimezone(timezone.utc).replace(tzinfo=None)
+        handle = {
+            "name": uploaded.name,
+            "uri": uploaded.uri,
+            "mime_type": uploaded.mime_type,
+            "expires_at": expires_at,
+        }
+        await self.resumes_collection.update_many(
+            {"username": username, "sha256": sha256},
+            {"$set": {"gemini_file": handle}},
+        )
+        # The same kind of part as a cache hit, so prompts with it look the
+        # same to the response cache
+        return file_part(handle)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
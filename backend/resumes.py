@@ -0,0 +1,120 @@
+"""Stored resumes, one document per uploaded file.
+
+Resumes used to live in a ``resumes`` array inside the user document, which
+made every user lookup carry all of them and every resume lookup scan the
+array. Each resume is now its own document in the ``resumes`` collection:
+
+    {username, filename, upload_date, file_path, sha256, gemini_file}
+
+indexed by ``(username, filename)`` for lookups and ``(username,
+upload_date)`` for listing. ``migrate`` moves any embedded arrays over, once:
+when it has finished it leaves a marker in the ``migrations`` collection and
+doesn't scan the users again.
+"""
+
+import logging
+import os
+from datetime import datetime
+
+from pymongo import ASCENDING, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# Fields that are not returned to the client
+_HIDDEN = {"_id": 0, "username": 0, "gemini_file": 0}
+
+MIGRATION_ID = "embedded-resumes"
+
+
+class ResumeStore:
+    def __init__(self, collection, users_collection, migrations_collection):
+        self.collection = collection
+        self.users_collection = users_collection
+        self.migrations_collection = migrations_collection
+
+    async def ensure_indexes(self):
+        await self.collection.create_index(
+            [("username", ASCENDING), ("filename", ASCENDING)]
+        )
+        await self.collection.create_index(
+            [("username", ASCENDING), ("upload_date", ASCENDING)]
+        )
+        await self.collection.create_index(
+            [("username", ASCENDING), ("sha256", ASCENDING)]
+        )
+        # One document per stored file; also makes the migration idempotent
+        await self.collection.create_index("file_path", unique=True)
+
+    async def migrate(self) -> int:
+        """Moves resumes embedded in user documents into the collection.
+
+        Safe to run again after an interruption: resumes are upserted by file
+        path and the array is only removed once they are all stored. Once it
+        has run to the end it is skipped; delete the marker to run it again.
+        """
+        if await self.migrations_collection.find_one({"_id": MIGRATION_ID}):
+            return 0
+        moved = 0
+        async for user in self.users_collection.find(
+            {"resumes": {"$exists": True}}, {"username": 1, "resumes": 1}
+        ):
+            operations = [
+                UpdateOne(
+                    {"file_path": resume["file_path"]},
+                    {"$setOnInsert": {**resume, "username": user["username"]}},
+                    upsert=True,
+                )
+                for resume in user["resumes"] or []
+            ]
+            if operations:
+                await self.collection.bulk_write(operations, ordered=False)
+            await self.users_collection.update_one(
+                {"_id": user["_id"]}, {"$unset": {"resumes": ""}}
+            )
+            moved += len(operations)
+        if moved:
+            logger.info("Moved %d embedded resumes to their own collection", moved)
+        await self.migrations_collection.update_one(
+            {"_id": MIGRATION_ID},
+            {"$set": {"completed_at": datetime.utcnow(), "moved": moved}},
+            upsert=True,
+        )
+        return moved
+
+    async def add(self, username: str, resume_info: dict):
+        # Upserted, as a re-upload within the same second reuses the path
+        await self.collection.update_one(
+            {"file_path": resume_info["file_path"]},
+            {"$set": {**resume_info, "username": username}},
+            upsert=True,
+        )
+
+    async def get(self, username: str, filename: str):
+        """The user's oldest resume with this filename, or None."""
+        return await self.collection.find_one(
+            {"username": username, "filename": filename},
+            sort=[("upload_date", ASCENDING)],
+        )
+
+    async def list(self, username: str, limit: int, offset: int = 0):
+        """Returns ``(total, resumes)``, oldest first."""
+        total = await self.collection.count_documents({"username": username})
+        cursor = (
+            self.collection.find({"username": username}, _HIDDEN)
+            .sort([("upload_date", ASCENDING), ("_id", ASCENDING)])
+            .skip(offset)
+            .limit(limit)
+        )
+        return total, await cursor.to_list(length=limit)
+
+    async def delete(self, username: str, filename: str) -> int:
+        """Deletes every resume of the user with this filename, files included."""
+        query = {"username": username, "filename": filename}
+        deleted = 0
+        async for resume in self.collection.find(query, {"file_path": 1}):
+            if os.path.exists(resume["file_path"]):
+                os.remove(resume["file_path"])
+            deleted += 1
+        if deleted:
+            await self.collection.delete_many(query)
+        return deleted
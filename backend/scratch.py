@@ -0,0 +1,172 @@
+"""Managed scratch space for temporary files such as answer videos.
+
+Every file lives under one directory and is accounted for here. Files handed
+out with ``temp_file`` are deleted when the request is done with them. The
+bytes held at once are capped by a quota: a request that would go over it is
+refused with 507 rather than filling the disk. Uploads ``reserve`` their space
+chunk by chunk before writing it, so concurrent uploads can't overshoot the
+quota between them. A background sweeper deletes
+files nobody is tracking any more (left behind by a crash or a killed worker)
+once they are old enough.
+
+Each process keeps its files in its own subdirectory of the root, named after
+its PID, so several workers can share the root without one's sweeper deleting
+another's files. Directories of processes that are gone are swept too.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+from executor import run_blocking
+
+logger = logging.getLogger(__name__)
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, but belongs to someone else
+        return True
+    return True
+
+
+class ScratchSpace:
+    def __init__(self, root, quota_bytes: int, orphan_max_age: float = 3600.0):
+        self.base = root
+        self.root = os.path.join(root, str(os.getpid()))
+        self.quota_bytes = quota_bytes
+        self.orphan_max_age = orphan_max_age
+        os.makedirs(self.root, exist_ok=True)
+        # path -> size
+        self._files = {}
+        self.bytes_in_use = 0
+        self.files_reclaimed = 0
+        self.bytes_reclaimed = 0
+        self.refused = 0
+        self.orphans_reclaimed = 0
+        # Called on the event loop before each sweep, to let go of files
+        # whose owners have stopped using them
+        self.on_sweep = []
+
+    def new_path(self, suffix: str = "") -> str:
+        """Returns a fresh path under the scratch root, owned by the caller."""
+        path = os.path.join(self.root, f"{uuid.uuid4().hex}{suffix}")
+        self._files[path] = 0
+        return path
+
+    def _refuse(self):
+        self.refused += 1
+        raise HTTPException(
+            status_code=507, detail="Not enough scratch space, try again later"
+        )
+
+    def reserve(self, path, nbytes: int):
+        """Accounts for ``nbytes`` about to be written to ``path``, or raises
+        507 if they don't fit in the quota.
+        """
+        if self.bytes_in_use + nbytes > self.quota_bytes:
+            self._refuse()
+        self._files[path] += nbytes
+        self.bytes_in_use += nbytes
+
+    def track(self, path):
+        """Records the current size of ``path`` and enforces the quota."""
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        self.bytes_in_use += size - self._files[path]
+        self._files[path] = size
+        if self.bytes_in_use > self.quota_bytes:
+            self._refuse()
+
+    def release(self, path):
+        """Deletes ``path`` and stops tracking it."""
+        if path in self._files:
+            self._remove(path)
+
+    @asynccontextmanager
+    async def temp_file(self, suffix: str = ""):
+        path = self.new_path(suffix)
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+    def _remove(self, path):
+        size = self._files.pop(path)
+        self.bytes_in_use -= size
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        self.files_reclaimed += 1
+        self.bytes_reclaimed += size
+
+    def _sweep_dir(self, directory, cutoff: float) -> int:
+        reclaimed = 0
+        for entry in os.scandir(directory):
+            if entry.path in self._files or not entry.is_file():
+                continue
+            try:
+                stat = entry.stat()
+                if stat.st_mtime > cutoff:
+                    continue
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            reclaimed += 1
+            self.files_reclaimed += 1
+            self.bytes_reclaimed += stat.st_size
+        return reclaimed
+
+    def sweep(self):
+        """Deletes untracked files older than ``orphan_max_age`` in this
+        process's directory, and in those of processes that have exited.
+        """
+        cutoff = time.time() - self.orphan_max_age
+        # Files in the root itself predate per-process directories
+        reclaimed = self._sweep_dir(self.base, cutoff)
+        for entry in os.scandir(self.base):
+            if not entry.is_dir():
+                continue
+            if entry.path == self.root:
+                reclaimed += self._sweep_dir(entry.path, cutoff)
+            elif entry.name.isdigit() and not _process_alive(int(entry.name)):
+                reclaimed += self._sweep_dir(entry.path, cutoff)
+                try:
+                    os.rmdir(entry.path)
+                except OSError:
+                    # Files too new to delete yet
+                    pass
+        self.orphans_reclaimed += reclaimed
+        return reclaimed
+
+    async def run_sweeper(self, interval: float):
+        while True:
+            try:
+                for hook in self.on_sweep:
+                    hook()
+                reclaimed = await run_blocking(self.sweep)
+                if reclaimed:
+                    logger.info("Scratch sweeper removed %d orphaned files", reclaimed)
+            except Exception:
+                logger.exception("Scratch sweep failed")
+            await asyncio.sleep(interval)
+
+    def stats(self) -> dict:
+        return {
+            "bytes_in_use": self.bytes_in_use,
+            "quota_bytes": self.quota_bytes,
+            "files": len(self._files),
+            "files_reclaimed": self.files_reclaimed,
+            "bytes_reclaimed": self.bytes_reclaimed,
+            "refused": self.refused,
+            "orphans_reclaimed": self.orphans_reclaimed,
+        }
@@ -0,0 +1,207 @@
+"""Server-side interview sessions.
+
+A session is created when the first question is generated. From then on the
+client sends only the session id and the new answer; the question being
+answered, the company and the history are kept here. Each turn is appended to
+the stored history with ``$push``, so the bytes sent over the wire per turn
+don't grow with the length of the interview.
+
+Sessions live in MongoDB, with recently used ones also cached in process.
+Every write bumps the session's ``revision``, and a cached copy is only used
+after a small read by id has confirmed it still has the revision, turn count
+and status MongoDB has; otherwise (another process wrote the session since)
+it is read again whole. That way the whole history isn't fetched on every
+turn, and an answer isn't analyzed against a stale turn. A turn is only
+recorded if the session still has the number of turns it was read with, so
+two submissions of the same answer can't both be recorded; the loser gets a
+409 and can reload the session.
+
+Each session also carries running score statistics, a condensed history and
+a rolling summary of older answers (see ``interview_summary``), updated as
+turns are recorded. The summary is updated after the turn, in the background;
+if another turn is recorded first, that update is dropped and the next one
+folds the same answers in.
+"""
+
+import copy
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from fastapi import HTTPException
+
+from interview_summary import empty_summary, fold_turn, score_statistics
+
+ACTIVE = "active"
+FINISHED = "finished"
+
+# Compared with MongoDB before a cached session is used
+VERSION_KEYS = ("revision", "turns", "status")
+
+
+class InterviewSessionStore:
+    def __init__(self, collection, max_cached: int = 1000, ttl_days: float = 30.0):
+        self.collection = collection
+        self.max_cached = max_cached
+        self.ttl_days = ttl_days
+        # session id -> document, least recently used first
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.conflicts = 0
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([("username", 1), ("updated_at", -1)])
+        # Abandoned sessions are removed by MongoDB after a while
+        await self.collection.create_index(
+            "updated_at", expireAfterSeconds=int(self.ttl_days * 24 * 3600)
+        )
+
+    def _remember(self, session: dict):
+        self._cache[session["_id"]] = session
+        self._cache.move_to_end(session["_id"])
+        while len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+
+    async def create(
+        self, username: str, company: str, question: str, resume_file=None
+    ) -> dict:
+        """``resume_file`` is the URI and MIME type of the resume's upload."""
+        now = datetime.utcnow()
+        session = {
+            "_id": uuid.uuid4().hex,
+            "username": username,
+            "company": company,
+            "status": ACTIVE,
+            "current_question": question,
+            "resume_file": resume_file,
+            "turns": 0,
+            "revision": 0,
+            "history": [],
+            **empty_summary(),
+            "created_at": now,
+            "updated_at": now,
+        }
+        await self.collection.insert_one(session)
+        self._remember(session)
+        return copy.deepcopy(session)
+
+    async def get(self, session_id: str, username: str):
+        """The user's session, or None. Returns a copy."""
+        session = self._cache.get(session_id)
+        if session is not None:
+            current = await self.collection.find_one(
+                {"_id": session_id}, {key: 1 for key in VERSION_KEYS}
+            )
+            if current is None:
+                self._cache.pop(session_id, None)
+                return None
+            if any(current.get(key) != session.get(key) for key in VERSION_KEYS):
+                # Written by another process since it was cached
+                self.stale += 1
+                session = None
+        if session is not None:
+            self.hits += 1
+            self._cache.move_to_end(session_id)
+        else:
+            self.misses += 1
+            session = await self.collection.find_one({"_id": session_id})
+            if session is None:
+                return None
+            self._remember(session)
+        if session["username"] != username:
+            return None
+        return copy.deepcopy(session)
+
+    async def record_turn(
+        self, session: dict, turn: dict, next_question=None, result=None, folded=None
+    ) -> dict:
+        """Appends ``turn`` and moves on to ``next_question``, or finishes the
+        interview with ``result`` if there is no next question.
+
+        ``folded`` is the session's condensed state after the turn, if the
+        caller already has it (see ``interview_summary.fold_turn``).
+
+        Raises HTTPException 409 if the session changed since it was read.
+        """
+        updates = {
+            "updated_at": datetime.utcnow(),
+            **(folded or fold_turn(session, turn)),
+        }
+        if next_question is not None:
+            updates["current_question"] = next_question
+        else:
+            updates["status"] = FINISHED
+            updates["result"] = result
+        outcome = await self.collection.update_one(
+            {"_id": session["_id"], "turns": session["turns"], "status": ACTIVE},
+            {
+                "$push": {"history": turn},
+                "$inc": {"turns": 1, "revision": 1},
+                "$set": updates,
+            },
+        )
+        if outcome.matched_count == 0:
+            self.conflicts += 1
+            self._cache.pop(session["_id"], None)
+            raise HTTPException(
+                status_code=409,
+                detail="The interview session has changed; reload it and retry",
+            )
+        # Apply the same update locally rather than reading the session back
+        updated = {**copy.deepcopy(session), **updates}
+        updated["history"].append(turn)
+        updated["turns"] += 1
+        updated["revision"] = updated.get("revision", 0) + 1
+        self._remember(updated)
+        return copy.deepcopy(updated)
+
+    async def update_summary(self, session_id: str, turns: int, folded: dict):
+        """Stores ``folded``'s summary and pending lines, unless turns were
+        recorded since the one it was made for (the session has ``turns``).
+        Returns whether it was stored.
+        """
+        updates = {"summary": folded["summary"], "pending": folded["pending"]}
+        outcome = await self.collection.update_one(
+            {"_id": session_id, "turns": turns},
+            {"$set": updates, "$inc": {"revision": 1}},
+        )
+        if outcome.matched_count == 0:
+            return False
+        cached = self._cache.pop(session_id, None)
+        if cached is not None and cached["turns"] == turns:
+            cached.update(copy.deepcopy(updates))
+            cached["revision"] = cached.get("revision", 0) + 1
+            self._remember(cached)
+        return True
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "cached": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "conflicts": self.conflicts,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+
+def public_session(session: dict) -> dict:
+    """The parts of a session that are returned to its owner."""
+    return {
+        "session_id": session["_id"],
+        "company": session["company"],
+        "status": session["status"],
+        "current_question": session["current_question"],
+        # Number of the question being answered, or of the last one once done
+        "question_count": session["turns"] + (session["status"] == ACTIVE),
+        "interview_history": session["history"],
+        "score_statistics": (
+            score_statistics(session["metrics"]) if session.get("metrics") else None
+        ),
+        "result": session.get("result"),
+        "created_at": session["created_at"],
+        "updated_at": session["updated_at"],
+    }
@@ -0,0 +1,161 @@
+"""Speculative pre-generation of the next interview question.
+
+As soon as a question is handed to the candidate, follow-up candidates for it
+are generated in the background: one for a strong answer (go deeper) and one
+for a weak answer (probe the gaps). By the time the answer video has been
+analyzed they are usually ready, and ``/next-question`` picks one by the
+answer's scores instead of waiting for another LLM round trip. If nothing
+usable is ready it falls back to generating a question fresh.
+"""
+
+import asyncio
+import json
+import logging
+import re
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def prefetch_prompt(question: str, company: str) -> str:
+    return f"""The candidate is currently answering this interview question for a role at {company}:
+    '{question}'
+
+    Before seeing the answer, prepare two follow-up technical questions:
+    - "advance": for a strong, accurate answer. Progressively increase the difficulty.
+    - "remediate": for a weak or partly wrong answer. Address the likely gaps.
+    Both should stay relevant to the candidate's experience.
+
+    Return ONLY a JSON object of the form {{"advance": "...", "remediate": "..."}}."""
+
+
+def parse_candidates(text: str) -> dict:
+    json_match = re.search(r"\{.*\}", text, re.DOTALL)
+    if not json_match:
+        return {}
+    try:
+        candidates = json.loads(json_match.group())
+    except json.JSONDecodeError:
+        return {}
+    return {
+        kind: candidates[kind].strip()
+        for kind in ("advance", "remediate")
+        if isinstance(candidates.get(kind), str) and candidates[kind].strip()
+    }
+
+
+def choose_candidate(scores: dict) -> str:
+    """Which candidate fits an answer with these scores."""
+    average = sum(scores.values()) / max(len(scores), 1)
+    if scores.get("technical_accuracy", 0) >= 4 and average >= 3.5:
+        return "advance"
+    return "remediate"
+
+
+class QuestionPrefetcher:
+    def __init__(
+        self,
+        generate,
+        enabled: bool = True,
+        max_entries: int = 1000,
+        ttl: float = 1800.0,
+        wait: float = 1.0,
+    ):
+        """``generate(contents)`` is awaited and returns the model's text."""
+        self.generate = generate
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.wait = wait
+        # (username, question) -> (created, task), oldest first
+        self._entries = OrderedDict()
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_ready = 0
+        self.failed = 0
+        self.fresh_generations = 0
+        self.fresh_seconds = 0.0
+        self.saved_seconds = 0.0
+
+    async def _candidates(self, contents):
+        try:
+            return parse_candidates(await self.generate(contents))
+        except Exception as e:
+            logger.warning("Question prefetch failed: %s", e)
+            return {}
+
+    def prefetch(self, username: str, question: str, company: str, context=()):
+        """Starts generating follow-ups for ``question`` in the background.
+
+        ``context`` is extra content for the model, such as the resume file.
+        """
+        key = (username, question)
+        if not self.enabled or key in self._entries:
+            return
+        contents = [*context, prefetch_prompt(question, company)]
+        task = asyncio.ensure_future(self._candidates(contents))
+        self._entries[key] = (time.monotonic(), task)
+        self.started += 1
+        while len(self._entries) > self.max_entries:
+            _, (_, oldest) = self._entries.popitem(last=False)
+            oldest.cancel()
+
+    def discard(self, username: str, question: str):
+        """Drops the follow-ups for a question that won't get one."""
+        entry = self._entries.pop((username, question), None)
+        if entry is not None:
+            entry[1].cancel()
+
+    async def take(self, username: str, question: str, scores: dict):
+        """A pre-generated follow-up for this answer, or None."""
+        if not self.enabled:
+            return None
+        entry = self._entries.pop((username, question), None)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            if entry is not None:
+                entry[1].cancel()
+            self.misses += 1
+            return None
+        task = entry[1]
+        if not task.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(task), self.wait)
+            except asyncio.TimeoutError:
+                task.cancel()
+                self.not_ready += 1
+                return None
+        candidates = task.result()
+        candidate = candidates.get(choose_candidate(scores))
+        if not candidate:
+            self.failed += 1
+            return None
+        self.hits += 1
+        if self.fresh_generations:
+            self.saved_seconds += self.fresh_seconds / self.fresh_generations
+        return candidate
+
+    def record_fresh(self, seconds: float):
+        """Records how long a fresh (non-speculative) question took."""
+        self.fresh_generations += 1
+        self.fresh_seconds += seconds
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.not_ready + self.failed
+        return {
+            "enabled": self.enabled,
+            "started": self.started,
+            "pending": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_ready": self.not_ready,
+            "failed": self.failed,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "fresh_generation_mean": (
+                round(self.fresh_seconds / self.fresh_generations, 3)
+                if self.fresh_generations
+                else None
+            ),
+            "turn_seconds_saved": round(self.saved_seconds, 3),
+        }
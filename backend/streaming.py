@@ -0,0 +1,119 @@
+"""Server-Sent Events helpers for streaming Gemini output to the browser.
+
+``stream_generation`` forwards each Gemini chunk as a ``chunk`` event as soon as
+it arrives and finishes with one ``done`` event carrying the same structured
+payload the non-streaming endpoint returns. Time to the first chunk and total
+time are recorded separately per endpoint.
+"""
+
+import json
+import time
+from collections import deque
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class StreamTimings:
+    def __init__(self, history_size: int = 1000):
+        self.history_size = history_size
+        self._first_chunk = {}
+        self._total = {}
+
+    def record(self, endpoint: str, first_chunk: float, total: float):
+        for samples, value in ((self._first_chunk, first_chunk), (self._total, total)):
+            samples.setdefault(endpoint, deque(maxlen=self.history_size)).append(value)
+
+    def stats(self) -> dict:
+        def median(samples):
+            ordered = sorted(samples)
+            return round(ordered[len(ordered) // 2], 3)
+
+        return {
+            endpoint: {
+                "streams": len(self._total[endpoint]),
+                "first_chunk_p50": median(self._first_chunk[endpoint]),
+                "total_p50": median(self._total[endpoint]),
+            }
+            for endpoint in self._total
+        }
+
+
+def _chunk_text(chunk) -> str:
+    try:
+        return chunk.text
+    except ValueError:
+        # A chunk with no text parts (e.g. only a finish reason)
+        return ""
+
+
+async def stream_generation(
+    model, contents, finish, timings, endpoint, started, fallback=None
+):
+    """Yields SSE events for one streamed ``generate_content`` call.
+
+    ``finish(text)`` is awaited with the full text and returns the payload of
+    the final ``done`` event. ``started`` is the ``time.perf_counter()`` at
+    which the request came in. If generation fails and ``fallback`` is given,
+    it is sent as the text instead of ending the stream with an ``error``.
+    """
+    first_chunk = None
+    parts = []
+    try:
+        response = await model.generate_content_async(
+            contents, stream=True, cache=endpoint
+        )
+        async for chunk in response:
+            text = _chunk_text(chunk)
+            if not text:
+                continue
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - started
+            parts.append(text)
+            yield sse_event("chunk", {"text": text})
+    except Exception as e:
+        if fallback is None:
+            yield sse_event("error", {"detail": str(e)})
+            return
+        print(f"Streaming {endpoint} failed, sending fallback: {str(e)}")
+        parts = [fallback]
+        yield sse_event("chunk", {"text": fallback})
+
+    async for event in _finish(
+        finish, "".join(parts).strip(), timings, endpoint, started, first_chunk
+    ):
+        yield event
+
+
+async def stream_text(text, finish, timings, endpoint, started):
+    """The events of ``stream_generation`` for text that is already known."""
+    yield sse_event("chunk", {"text": text})
+    async for event in _finish(
+        finish, text, timings, endpoint, started, time.perf_counter() - started
+    ):
+        yield event
+
+
+async def _finish(finish, text, timings, endpoint, started, first_chunk):
+    try:
+        payload = await finish(text)
+    except Exception as e:
+        yield sse_event("error", {"detail": str(e)})
+        return
+    total = time.perf_counter() - started
+    if first_chunk is None:
+        first_chunk = total
+    timings.record(endpoint, first_chunk, total)
+    yield sse_event(
+        "done",
+        {
+            **payload,
+            "timings": {
+                "first_chunk_seconds": round(first_chunk, 3),
+                "total_seconds": round(total, 3),
+            },
+        },
+    )
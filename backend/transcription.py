@@ -0,0 +1,181 @@
+"""Local speech-to-text for answer videos.
+
+The answer's audio (a 16 kHz mono WAV written while the video is downscaled,
+see ``video_preprocessing``) is transcribed on this machine with one of
+SpeechRecognition's offline recognizers, chosen with ``STT_BACKEND``:
+
+    sphinx          needs pocketsphinx
+    vosk            needs vosk and a model, fetched with ``sprc download vosk``
+    whisper         needs openai-whisper (``STT_MODEL``, default "base")
+    faster_whisper  needs faster-whisper (``STT_MODEL``, default "base")
+
+None of them is installed by default, so transcription is off unless
+``STT_BACKEND`` is set. SpeechRecognition reads and resamples the audio, and
+finds the models it ships or downloads, but its ``recognize_*`` methods load
+the model again on every call, so the engine is called directly on a model
+each worker process loads once, on its first clip. Recognition is CPU-bound
+and runs in worker processes (``STT_POOL_SIZE``, one by default, since each
+holds its own model), within the CPU budget shared with the other process
+pools (see ``executor``).
+"""
+
+import json
+import logging
+import os
+import time
+import wave
+
+from executor import ProcessPool, run_blocking
+
+logger = logging.getLogger(__name__)
+
+STT_BACKEND = os.getenv("STT_BACKEND", "")
+STT_MODEL = os.getenv("STT_MODEL", "base")
+STT_LANGUAGE = os.getenv("STT_LANGUAGE", "en")
+STT_POOL_SIZE = int(os.getenv("STT_POOL_SIZE", "1"))
+
+BACKENDS = ("sphinx", "vosk", "whisper", "faster_whisper")
+# What every engine is fed
+SAMPLE_RATE = 16000
+
+transcription_pool = ProcessPool(STT_POOL_SIZE)
+# Model of this worker process and the (backend, model) it was loaded for
+_model = None
+_model_key = None
+
+
+def audio_seconds(audio_path: str) -> float:
+    with wave.open(audio_path) as audio:
+        return audio.getnframes() / audio.getframerate()
+
+
+def _package_dir() -> str:
+    import speech_recognition as sr
+
+    return os.path.dirname(sr.__file__)
+
+
+def load_model(backend: str = STT_BACKEND, model: str = STT_MODEL):
+    """This worker's model for ``backend``, loaded on first use."""
+    global _model, _model_key
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown speech recognition backend {backend!r}")
+    if _model_key == (backend, model):
+        return _model
+    started = time.perf_counter()
+    if backend == "sphinx":
+        from pocketsphinx import pocketsphinx
+
+        data = os.path.join(_package_dir(), "pocketsphinx-data", "en-US")
+        config = pocketsphinx.Config()
+        config.set_string("-hmm", os.path.join(data, "acoustic-model"))
+        config.set_string("-lm", os.path.join(data, "language-model.lm.bin"))
+        config.set_string("-dict", os.path.join(data, "pronounciation-dictionary.dict"))
+        config.set_string("-logfn", os.devnull)
+        loaded = pocketsphinx.Decoder(config)
+    elif backend == "vosk":
+        import vosk
+
+        path = os.path.join(_package_dir(), "models", "vosk")
+        if not os.path.isdir(path):
+            raise RuntimeError(
+                f"No Vosk model at {path}, fetch one with `sprc download vosk`"
+            )
+        loaded = vosk.Model(path)
+    elif backend == "whisper":
+        import torch
+        import whisper
+
+        # One core per worker, as the CPU budget counts it
+        torch.set_num_threads(1)
+        loaded = whisper.load_model(model)
+    else:
+        from faster_whisper import WhisperModel
+
+        loaded = WhisperModel(model, cpu_threads=1)
+    logger.info(
+        "Loaded %s speech model in %.1fs", backend, time.perf_counter() - started
+    )
+    _model, _model_key = loaded, (backend, model)
+    return _model
+
+
+def _read_audio(audio_path: str) -> bytes:
+    """16 kHz mono 16-bit PCM of the WAV file at ``audio_path``."""
+    import speech_recognition as sr
+
+    with sr.AudioFile(audio_path) as source:
+        audio = sr.Recognizer().record(source)
+    return audio.get_raw_data(convert_rate=SAMPLE_RATE, convert_width=2)
+
+
+def transcribe_sync(
+    audio_path: str,
+    backend: str = STT_BACKEND,
+    model: str = STT_MODEL,
+    language: str = STT_LANGUAGE,
+) -> str:
+    """The text spoken in the WAV file at ``audio_path``; empty if none."""
+    engine = load_model(backend, model)
+    pcm = _read_audio(audio_path)
+    if backend == "sphinx":
+        engine.start_utt()
+        engine.process_raw(pcm, False, True)
+        engine.end_utt()
+        hypothesis = engine.hyp()
+        return hypothesis.hypstr.strip() if hypothesis is not None else ""
+    if backend == "vosk":
+        import vosk
+
+        recognizer = vosk.KaldiRecognizer(engine, SAMPLE_RATE)
+        recognizer.AcceptWaveform(pcm)
+        return json.loads(recognizer.FinalResult())["text"].strip()
+
+    import numpy as np
+
+    samples = np.frombuffer(pcm, np.int16).astype(np.float32) / 32768.0
+    if backend == "whisper":
+        return engine.transcribe(samples, language=language, fp16=False)["text"].strip()
+    segments, _ = engine.transcribe(samples, language=language)
+    return " ".join(segment.text.strip() for segment in segments).strip()
+
+
+class Transcriber:
+    def __init__(self, backend: str = STT_BACKEND):
+        self.backend = backend
+        self.enabled = bool(backend)
+        self.clips = 0
+        self.failures = 0
+        self.audio_seconds = 0.0
+        self.seconds = 0.0
+
+    async def transcribe(self, audio_path: str):
+        """The transcript, or None if it couldn't be made."""
+        started = time.perf_counter()
+        try:
+            text = await transcription_pool.run(
+                transcribe_sync, audio_path, self.backend
+            )
+            duration = await run_blocking(audio_seconds, audio_path)
+        except Exception:
+            self.failures += 1
+            logger.exception("Could not transcribe %s", audio_path)
+            return None
+        self.clips += 1
+        self.audio_seconds += duration
+        self.seconds += time.perf_counter() - started
+        return text
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend or None,
+            "clips": self.clips,
+            "failures": self.failures,
+            "audio_seconds": round(self.audio_seconds, 1),
+            # Below 1 means faster than the answers were spoken
+            "real_time_factor": (
+                round(self.seconds / self.audio_seconds, 3)
+                if self.audio_seconds
+                else None
+            ),
+        }
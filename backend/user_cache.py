@@ -0,0 +1,83 @@
+"""Short-lived in-memory cache of user documents.
+
+Every authenticated request needs the user's document. Within one request it
+is loaded once by the ``load_user`` dependency and shared by everything that
+depends on it; across requests it is kept here for ``ttl`` seconds, so a burst
+of requests from the same user costs one MongoDB lookup.
+
+Every write to a user document in this process invalidates its entry, and a
+lookup that was already under way when it did isn't cached, since it may have
+read the document from before the write. Writes from other processes are
+picked up once the entry expires, which is why the TTL is short.
+"""
+
+import copy
+import time
+from collections import OrderedDict
+
+
+class UserCache:
+    def __init__(
+        self,
+        collection,
+        ttl: float = 30.0,
+        max_entries: int = 10000,
+        projection=None,
+    ):
+        """``projection`` limits the fields that are loaded and cached."""
+        self.collection = collection
+        self.projection = projection
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # username -> (loaded_at, document), least recently used first
+        self._entries = OrderedDict()
+        # username -> times invalidated, most recently invalidated last
+        self._generations = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def get(self, username: str):
+        """The user's document, or None if there is no such user.
+
+        Returns a copy, so callers may change it freely.
+        """
+        entry = self._entries.get(username)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            self._entries.move_to_end(username)
+            self.hits += 1
+            return copy.deepcopy(entry[1])
+
+        self.misses += 1
+        generation = self._generations.get(username, 0)
+        user = await self.collection.find_one({"username": username}, self.projection)
+        if self._generations.get(username, 0) != generation:
+            # Invalidated while it was being read
+            return copy.deepcopy(user)
+        if user is None:
+            # Not cached, so a user registered meanwhile is found next time
+            self._entries.pop(username, None)
+            return None
+        self._entries[username] = (time.monotonic(), user)
+        self._entries.move_to_end(username)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return copy.deepcopy(user)
+
+    def invalidate(self, username: str):
+        self._generations[username] = self._generations.get(username, 0) + 1
+        self._generations.move_to_end(username)
+        while len(self._generations) > self.max_entries:
+            self._generations.popitem(last=False)
+        if self._entries.pop(username, None) is not None:
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
@@ -0,0 +1,182 @@
+"""Shrinks answer videos before they are uploaded to Gemini.
+
+Browser recordings come in at the camera's resolution and frame rate, far more
+than the model looks at. Each video is re-encoded to at most
+``VIDEO_MAX_HEIGHT`` pixels high at ``VIDEO_FPS`` frames per second and a
+target bitrate, which cuts both the upload and Gemini's processing of the
+file. The audio can also be written to a separate 16 kHz mono WAV for speech
+recognition. Everything is done by one ffmpeg run (the binary that ships with
+moviepy).
+
+Encoding is CPU-bound, so it runs in worker processes
+(``VIDEO_PREPROCESS_POOL_SIZE``, up to the shared CPU budget by default; see
+``executor``). Each encode holds one slot of that budget, so ffmpeg is kept to
+one thread. If it fails, or doesn't make the file smaller, the original is
+used.
+
+    VIDEO_PREPROCESS         true
+    VIDEO_MAX_HEIGHT         480
+    VIDEO_FPS                10
+    VIDEO_BITRATE            400k
+    VIDEO_AUDIO_BITRATE      64k
+"""
+
+import logging
+import os
+import subprocess
+import time
+
+from executor import CPU_BUDGET, ProcessPool
+
+logger = logging.getLogger(__name__)
+
+VIDEO_PREPROCESS = os.getenv("VIDEO_PREPROCESS", "true").lower() == "true"
+VIDEO_PREPROCESS_POOL_SIZE = int(
+    os.getenv("VIDEO_PREPROCESS_POOL_SIZE", str(CPU_BUDGET))
+)
+VIDEO_MAX_HEIGHT = int(os.getenv("VIDEO_MAX_HEIGHT", "480"))
+VIDEO_FPS = float(os.getenv("VIDEO_FPS", "10"))
+VIDEO_BITRATE = os.getenv("VIDEO_BITRATE", "400k")
+VIDEO_AUDIO_BITRATE = os.getenv("VIDEO_AUDIO_BITRATE", "64k")
+
+# Sample rate of the extracted audio, what speech recognizers expect
+AUDIO_SAMPLE_RATE = 16000
+
+video_pool = ProcessPool(VIDEO_PREPROCESS_POOL_SIZE)
+
+
+def preprocess_video_sync(
+    source: str,
+    destination: str,
+    audio_destination=None,
+    max_height: int = VIDEO_MAX_HEIGHT,
+    fps: float = VIDEO_FPS,
+    bitrate: str = VIDEO_BITRATE,
+    audio_bitrate: str = VIDEO_AUDIO_BITRATE,
+) -> dict:
+    """Re-encodes ``source`` into ``destination`` (H.264/AAC in MP4).
+
+    With ``audio_destination`` the audio is also written there as WAV, from
+    the same decoding pass. Returns the sizes in and out.
+    """
+    # Imported here so only the worker processes pay for it. moviepy's own
+    # frame-by-frame pipeline is a few times slower than letting its ffmpeg
+    # binary scale and encode in one go, so only the probing and the binary
+    # are used from it.
+    from moviepy.config import FFMPEG_BINARY
+    from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+    infos = ffmpeg_parse_infos(source)
+    width, height = infos["video_size"]
+    source_fps = infos.get("video_fps") or fps
+    # The width is kept even for H.264
+    height = min(max_height, height - height % 2)
+    command = [
+        FFMPEG_BINARY,
+        "-y",
+        "-loglevel",
+        "error",
+        # One core per encode, as the CPU budget counts it
+        "-threads",
+        "1",
+        "-filter_threads",
+        "1",
+        "-i",
+        source,
+        "-map",
+        "0:v:0",
+        "-map",
+        "0:a:0?",
+        "-vf",
+        f"scale=-2:{height},fps={min(fps, source_fps)}",
+        "-c:v",
+        "libx264",
+        "-preset",
+        "veryfast",
+        "-threads",
+        "1",
+        "-b:v",
+        bitrate,
+        "-c:a",
+        "aac",
+        "-b:a",
+        audio_bitrate,
+        "-movflags",
+        "+faststart",
+        destination,
+    ]
+    audio = bool(audio_destination and infos["audio_found"])
+    if audio:
+        command += [
+            "-map",
+            "0:a:0",
+            "-vn",
+            "-ac",
+            "1",
+            "-ar",
+            str(AUDIO_SAMPLE_RATE),
+            "-c:a",
+            "pcm_s16le",
+            audio_destination,
+        ]
+    subprocess.run(command, check=True, capture_output=True)
+    return {
+        "bytes_in": os.path.getsize(source),
+        "bytes_out": os.path.getsize(destination),
+        "audio": audio,
+    }
+
+
+class VideoPreprocessor:
+    def __init__(self, enabled: bool = VIDEO_PREPROCESS):
+        self.enabled = enabled
+        self.videos = 0
+        self.failures = 0
+        self.not_smaller = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+
+    async def prepare(self, source: str, destination: str, audio_destination=None):
+        """Returns the path to upload: ``destination`` if the video was made
+        smaller, otherwise ``source``.
+        """
+        if not self.enabled:
+            return source
+        started = time.perf_counter()
+        try:
+            result = await video_pool.run(
+                preprocess_video_sync, source, destination, audio_destination
+            )
+        except Exception:
+            self.failures += 1
+            logger.exception("Could not preprocess %s, uploading it as is", source)
+            return source
+        finally:
+            self.seconds += time.perf_counter() - started
+
+        self.videos += 1
+        self.bytes_in += result["bytes_in"]
+        if result["bytes_out"] >= result["bytes_in"]:
+            self.not_smaller += 1
+            self.bytes_out += result["bytes_in"]
+            return source
+        self.bytes_out += result["bytes_out"]
+        return destination
+
+    def stats(self) -> dict:
+        attempts = self.videos + self.failures
+        return {
+            "enabled": self.enabled,
+            "videos": self.videos,
+            "failures": self.failures,
+            "not_smaller": self.not_smaller,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "compression_ratio": (
+                round(self.bytes_in / self.bytes_out, 2) if self.bytes_out else None
+            ),
+            "mean_seconds_added": (
+                round(self.seconds / attempts, 3) if attempts else None
+            ),
+        }
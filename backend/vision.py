@@ -0,0 +1,284 @@
+"""Local eye-contact and body-language signals from an answer video.
+
+Frames are sampled at ``VISION_SAMPLE_FPS`` (the rest are skipped without
+being decoded), shrunk to ``VISION_FRAME_WIDTH`` pixels wide and turned to
+grayscale. From them:
+
+- face presence: the share of sampled frames with a face in them;
+- gaze: the share of frames where the face is turned to the camera. With a
+  YuNet model (``FACE_DETECTOR_MODEL``, an ONNX file for
+  ``cv2.FaceDetectorYN``) this is judged from where the nose sits between the
+  eyes; with OpenCV's bundled Haar cascades, from whether the frontal face
+  detector finds the face with both eyes open;
+- motion: how much of the picture changes between samples, and how far the
+  face moves, computed over all frames at once with NumPy.
+
+These are turned into 1-5 ``eye_contact`` and ``body_language`` scores that
+can stand in for or be blended with the video model's (``merge_scores``). If
+no face detector is available (OpenCV builds without the Haar data and no
+YuNet model), only motion is measured and no eye-contact score is given.
+
+The work is CPU-bound and runs in worker processes (``VISION_POOL_SIZE``, up to
+the shared CPU budget by default; see ``executor``).
+"""
+
+import logging
+import os
+import time
+
+import numpy as np
+
+from executor import CPU_BUDGET, ProcessPool
+
+logger = logging.getLogger(__name__)
+
+# off: not run; merge: averaged with the model's scores; replace: used instead
+LOCAL_VISION = os.getenv("LOCAL_VISION", "merge").lower()
+VISION_POOL_SIZE = int(os.getenv("VISION_POOL_SIZE", str(CPU_BUDGET)))
+VISION_SAMPLE_FPS = float(os.getenv("VISION_SAMPLE_FPS", "2"))
+VISION_FRAME_WIDTH = int(os.getenv("VISION_FRAME_WIDTH", "320"))
+FACE_DETECTOR_MODEL = os.getenv("FACE_DETECTOR_MODEL", "")
+
+# Nose further than this share of the eye distance from the eyes' midpoint
+# means the head is turned away
+MAX_GAZE_OFFSET = 0.25
+# The scores measured here
+LOCAL_DIMENSIONS = ("eye_contact", "body_language")
+# Mean change between samples (0-255 scale) of a candidate sitting still
+# but naturally, and of one fidgeting or moving out of shot
+CALM_MOTION = 2.0
+RESTLESS_MOTION = 12.0
+
+vision_pool = ProcessPool(VISION_POOL_SIZE)
+# Face detector of this worker process, loaded on first use
+_detector = None
+
+
+class _YuNetDetector:
+    name = "yunet"
+
+    def __init__(self, model_path):
+        import cv2
+
+        self.detector = cv2.FaceDetectorYN.create(model_path, "", (0, 0))
+
+    def __call__(self, frame_bgr, gray):
+        """``(x, y, w, h, facing)`` for the largest face, or None."""
+        height, width = gray.shape
+        self.detector.setInputSize((width, height))
+        _, faces = self.detector.detect(frame_bgr)
+        if faces is None or not len(faces):
+            return None
+        face = faces[np.argmax(faces[:, 2] * faces[:, 3])]
+        right_eye, left_eye, nose = face[4:6], face[6:8], face[8:10]
+        eye_distance = np.linalg.norm(left_eye - right_eye) or 1.0
+        offset = abs(nose[0] - (left_eye[0] + right_eye[0]) / 2) / eye_distance
+        return (*face[:4], offset <= MAX_GAZE_OFFSET)
+
+
+class _HaarDetector:
+    name = "haar"
+
+    def __init__(self, cv2):
+        self.faces = cv2.CascadeClassifier(
+            cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+        )
+        self.eyes = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_eye.xml")
+        if self.faces.empty() or self.eyes.empty():
+            raise RuntimeError("OpenCV's Haar cascades are not available")
+
+    def __call__(self, frame_bgr, gray):
+        faces = self.faces.detectMultiScale(gray, scaleFactor=1.2, minNeighbors=5)
+        if not len(faces):
+            return None
+        x, y, w, h = max(faces, key=lambda face: face[2] * face[3])
+        # The frontal detector only finds faces turned to the camera; both
+        # eyes in the upper half means they are open and not looking down
+        eyes = self.eyes.detectMultiScale(gray[y : y + h // 2, x : x + w])
+        return x, y, w, h, len(eyes) >= 2
+
+
+def _get_detector():
+    global _detector
+    if _detector is None:
+        import cv2
+
+        if FACE_DETECTOR_MODEL:
+            _detector = _YuNetDetector(FACE_DETECTOR_MODEL)
+        elif hasattr(cv2, "CascadeClassifier"):
+            try:
+                _detector = _HaarDetector(cv2)
+            except RuntimeError:
+                _detector = False
+        else:
+            _detector = False
+    return _detector
+
+
+def sample_frames(video_path: str, sample_fps: float, width: int):
+    """``(frames, frames_read)``: decimated color frames ``width`` pixels
+    wide, and the number of frames in the video.
+    """
+    import cv2
+
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise ValueError(f"Could not open {video_path}")
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    if not fps or fps > 240:
+        # Browser WebM files often don't say; assume a webcam's rate
+        fps = 30.0
+    step = max(1, round(fps / sample_fps))
+    frames = []
+    index = 0
+    try:
+        while capture.grab():
+            if index % step == 0:
+                ok, frame = capture.retrieve()
+                if not ok:
+                    break
+                height = round(frame.shape[0] * width / frame.shape[1])
+                frames.append(
+                    cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+                )
+            index += 1
+    finally:
+        capture.release()
+    return frames, index
+
+
+def analyze_frames_sync(
+    video_path: str,
+    sample_fps: float = VISION_SAMPLE_FPS,
+    width: int = VISION_FRAME_WIDTH,
+) -> dict:
+    """Face, gaze and motion statistics of the video at ``video_path``."""
+    import cv2
+
+    # One core per task, as the CPU budget counts it
+    cv2.setNumThreads(1)
+    started = time.perf_counter()
+    frames, frames_read = sample_frames(video_path, sample_fps, width)
+    if not frames:
+        raise ValueError(f"No frames in {video_path}")
+    grays = np.stack([cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) for frame in frames])
+
+    # Mean absolute change between consecutive samples, per sample
+    changes = np.abs(np.diff(grays.astype(np.int16), axis=0)).mean(axis=(1, 2))
+    result = {
+        "frames": len(frames),
+        "frames_read": frames_read,
+        "motion_mean": round(float(changes.mean()), 2) if len(changes) else 0.0,
+        "motion_p90": (
+            round(float(np.percentile(changes, 90)), 2) if len(changes) else 0.0
+        ),
+        "face_detector": None,
+    }
+
+    detector = _get_detector()
+    if detector:
+        result["face_detector"] = detector.name
+        detections = [detector(frame, gray) for frame, gray in zip(frames, grays)]
+        found = np.array([d is not None for d in detections])
+        boxes = np.array([d[:4] for d in detections if d is not None], dtype=float)
+        facing = np.array([bool(d[4]) for d in detections if d is not None])
+        result["face_presence"] = round(float(found.mean()), 3)
+        result["facing_camera"] = round(float(facing.mean()), 3) if found.any() else 0.0
+        if len(boxes) > 1:
+            # Movement of the face's center between samples, in face widths
+            centers = boxes[:, :2] + boxes[:, 2:] / 2
+            steps = np.linalg.norm(np.diff(centers, axis=0), axis=1)
+            result["head_movement"] = round(float((steps / boxes[1:, 2]).mean()), 3)
+        else:
+            result["head_movement"] = None
+
+    result["scores"] = local_scores(result)
+    result["analysis_seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def _scale(value: float) -> int:
+    """0-1 to a 1-5 score."""
+    return int(round(1 + 4 * min(1.0, max(0.0, value))))
+
+
+def local_scores(metrics: dict) -> dict:
+    # Calm is best; the score falls off between calm and restless motion
+    motion = metrics["motion_mean"]
+    steadiness = 1 - (motion - CALM_MOTION) / (RESTLESS_MOTION - CALM_MOTION)
+    steadiness = min(1.0, max(0.0, steadiness))
+    if metrics["face_detector"] is None:
+        return {"body_language": _scale(steadiness)}
+    head = metrics["head_movement"]
+    if head is not None:
+        # Moving more than half a face width between samples is a lot
+        steadiness = (steadiness + max(0.0, 1 - head / 0.5)) / 2
+    presence = metrics["face_presence"]
+    return {
+        "eye_contact": _scale(presence * metrics["facing_camera"]),
+        "body_language": _scale(presence * steadiness),
+    }
+
+
+def merge_scores(model_scores: dict, local: dict, mode: str = LOCAL_VISION) -> dict:
+    """The model's scores with the local ones averaged in (``merge``) or put
+    in their place (``replace``).
+    """
+    merged = dict(model_scores)
+    for dimension, value in local.items():
+        theirs = model_scores.get(dimension)
+        if mode == "merge" and isinstance(theirs, (int, float)) and theirs > 0:
+            merged[dimension] = round((theirs + value) / 2, 1)
+        else:
+            merged[dimension] = value
+    return merged
+
+
+class LocalVision:
+    def __init__(self, mode: str = LOCAL_VISION):
+        self.mode = mode
+        self.enabled = mode in ("merge", "replace")
+        self.videos = 0
+        self.failures = 0
+        self.frames = 0
+        self.seconds = 0.0
+
+    async def analyze(self, video_path: str):
+        """The frame statistics and local scores, or None if turned off or
+        it failed.
+        """
+        if not self.enabled:
+            return None
+        try:
+            result = await vision_pool.run(analyze_frames_sync, video_path)
+        except Exception:
+            self.failures += 1
+            logger.exception("Local video analysis of %s failed", video_path)
+            return None
+        self.videos += 1
+        self.frames += result["frames_read"]
+        self.seconds += result["analysis_seconds"]
+        return result
+
+    @property
+    def replaced(self) -> tuple:
+        """The dimensions the video model needn't be asked to score."""
+        return LOCAL_DIMENSIONS if self.mode == "replace" else ()
+
+    def merge(self, model_scores: dict, result) -> dict:
+        local = result["scores"] if result is not None else {}
+        # Not asked of the model, so 0 (not applicable) if not measured here
+        missing = {d: 0 for d in self.replaced if d not in local}
+        return merge_scores(model_scores, {**missing, **local}, self.mode)
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "videos": self.videos,
+            "failures": self.failures,
+            "frames_read": self.frames,
+            # Video frames gone through per second of analysis, in one worker
+            "frames_per_second": (
+                round(self.frames / self.seconds, 1) if self.seconds else None
+            ),
+        }
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import { useLocation, useNavigate } from "react-router-dom";
 import ReactMarkdown from "react-markdown";
 import VideoRecorder from "./VideoRecorder";
@@ -28,6 +28,128 @@ function Interview() {
   const [dashboardData, setDashboardData] = useState(null);
   const [isLoading, setIsLoading] = useState(false);
   const [showFeedback, setShowFeedback] = useState(false);
+  // The server keeps the interview; a reload picks it up again from here
+  const [sessionId] = useState(
+    location.state?.sessionId || sessionStorage.getItem("interviewSessionId")
+  );
+
+  const showResult = (data) => {
+    sessionStorage.removeItem("interviewSessionId");
+    setShowFeedback(true);
+    setInterviewHistory(data.interview_history);
+    setFeedback(data.final_feedback);
+
+    // Ensure final feedback is added to the dashboardData
+    if (data.dashboard_data && data.final_feedback) {
+      setDashboardData({
+        ...data.dashboard_data,
+        detailed_analysis: {
+          ...data.dashboard_data.detailed_analysis,
+          final_feedback: data.final_feedback,
+        },
+      });
+    } else {
+      setDashboardData(data.dashboard_data);
+    }
+  };
+
+  useEffect(() => {
+    if (!sessionId) return;
+    sessionStorage.setItem("interviewSessionId", sessionId);
+    if (location.state?.firstQuestion) return;
+
+    const resumeSession = async () => {
+      const token = localStorage.getItem("token");
+      const response = await fetch(
+        `http://localhost:8000/interview-sessions/${sessionId}`,
+        { headers: { Authorization: `Bearer ${token}` } }
+      );
+      if (!response.ok) {
+        sessionStorage.removeItem("interviewSessionId");
+        return;
+      }
+      const session = await response.json();
+      if (session.status === "finished") {
+        showResult({
+          ...session.result,
+          interview_history: session.interview_history,
+        });
+      } else {
+        setCurrentQuestion(session.current_question);
+        setQuestionCount(session.question_count);
+        setInterviewHistory(session.interview_history);
+      }
+    };
+    resumeSession().catch((error) =>
+      console.error("Failed to resume interview:", error)
+    );
+  }, [sessionId]);
+
+  // The answer is uploaded piece by piece while it is being recorded
+  const uploadRef = useRef(null);
+
+  const authHeaders = () => ({
+    Authorization: `Bearer ${localStorage.getItem("token")}`,
+  });
+
+  const startAnswerUpload = () => {
+    const formData = new FormData();
+    formData.append("session_id", sessionId);
+    const upload = { id: null, offset: 0, failed: false };
+    upload.pending = fetch("http://localhost:8000/answer-uploads", {
+      method: "POST",
+      headers: authHeaders(),
+      body: formData,
+    })
+      .then((response) => {
+        if (!response.ok) throw new Error(`status ${response.status}`);
+        return response.json();
+      })
+      .then((data) => {
+        upload.id = data.upload_id;
+      });
+    uploadRef.current = upload;
+  };
+
+  const sendAnswerPiece = (piece) => {
+    const upload = uploadRef.current;
+    if (!upload) return;
+    // Pieces are sent one after the other, each at the offset it starts at
+    upload.pending = upload.pending
+      .then(async () => {
+        if (upload.failed) return;
+        const response = await fetch(
+          `http://localhost:8000/answer-uploads/${upload.id}?offset=${upload.offset}`,
+          { method: "PUT", headers: authHeaders(), body: piece }
+        );
+        if (!response.ok) throw new Error(`status ${response.status}`);
+        upload.offset = (await response.json()).received;
+      })
+      .catch((error) => {
+        // The whole recording is sent at the end instead
+        console.error("Answer upload failed:", error);
+        upload.failed = true;
+      });
+  };
+
+  // Finishes the upload, which starts the analysis; null if it failed
+  const finishAnswerUpload = async () => {
+    const upload = uploadRef.current;
+    uploadRef.current = null;
+    if (!upload) return null;
+    try {
+      await upload.pending;
+      if (upload.failed) return null;
+      const response = await fetch(
+        `http://localhost:8000/answer-uploads/${upload.id}/finish`,
+        { method: "POST", headers: authHeaders() }
+      );
+      return response.ok ? upload.id : null;
+    } catch (error) {
+      console.error("Answer upload failed:", error);
+      return null;
+    }
+  };
 
   const handleStartRecording = () => setIsRecording(true);
   const handleStopRecording = () => setIsRecording(false);
@@ -35,17 +157,26 @@ function Interview() {
   const handleRecordingStart = () => {
     // Stop any ongoing speech when recording starts
     window.speechSynthesis.cancel();
+    if (sessionId) startAnswerUpload();
   };
 
   const handleRecordingComplete = async (blob) => {
     try {
       setIsLoading(true);
       const formData = new FormData();
-      formData.append("video", blob, "recording.webm");
-      formData.append("previous_question", currentQuestion);
-      formData.append("company", location.state?.company);
-      formData.append("question_count", questionCount);
-      formData.append("interview_history", JSON.stringify(interviewHistory));
+      const uploadId = await finishAnswerUpload();
+      if (uploadId) {
+        formData.append("upload_id", uploadId);
+      } else {
+        formData.append("video", blob, "recording.webm");
+      }
+      if (sessionId) {
+        formData.append("session_id", sessionId);
+      } else {
+        formData.append("previous_question", currentQuestion);
+        formData.append("company", location.state?.company);
+        formData.append("interview_history", JSON.stringify(interviewHistory));
+      }
 
       const token = localStorage.getItem("token");
       console.log("Sending request to backend...");
@@ -71,24 +202,12 @@ function Interview() {
 
       if (!data.done) {
         setCurrentQuestion(data.next_question);
-        setQuestionCount((prev) => prev + 1);
-        setInterviewHistory(data.interview_history);
-      } else {
-        setShowFeedback(true);
-        setDashboardData(data.dashboard_data);
-        setInterviewHistory(data.interview_history);
-        setFeedback(data.final_feedback);
-
-        // Ensure final feedback is added to the dashboardData
-        if (data.dashboard_data && data.final_feedback) {
-          setDashboardData({
-            ...data.dashboard_data,
-            detailed_analysis: {
-              ...data.dashboard_data.detailed_analysis,
-              final_feedback: data.final_feedback,
-            },
-          });
+        setQuestionCount((prev) => data.question_count || prev + 1);
+        if (data.interview_history) {
+          setInterviewHistory(data.interview_history);
         }
+      } else {
+        showResult(data);
       }
     } catch (error) {
       console.error("Error in handleRecordingComplete:", error);
@@ -203,6 +322,8 @@ function Interview() {
               isRecording={isRecording}
               onStopRecording={handleStopRecording}
               onRecordingStart={handleRecordingStart}
+              onRecordingData={sessionId ? sendAnswerPiece : undefined}
+              timeslice={sessionId ? 1000 : undefined}
             />
 
             <div className="flex justify-center">
@@ -122,6 +122,7 @@ function UploadForm() {
             state: {
               firstQuestion: data.question,
               company: company,
+              sessionId: data.session_id,
             },
           });
         }, 1000);
@@ -6,6 +6,8 @@ const VideoRecorder = ({
   isRecording,
   onStopRecording,
   onRecordingStart,
+  onRecordingData,
+  timeslice,
 }) => {
   const videoRef = useRef(null);
   const mediaRecorderRef = useRef(null);
@@ -57,6 +59,7 @@ const VideoRecorder = ({
     mediaRecorder.ondataavailable = (event) => {
       if (event.data.size > 0) {
         chunksRef.current.push(event.data);
+        onRecordingData?.(event.data);
       }
     };
 
@@ -66,7 +69,8 @@ const VideoRecorder = ({
     };
 
     mediaRecorderRef.current = mediaRecorder;
-    mediaRecorder.start();
+    // With a timeslice, pieces of the recording arrive while it goes on
+    mediaRecorder.start(timeslice);
     onRecordingStart?.();
   };
 